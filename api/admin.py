@@ -1,29 +1,103 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.utils import get_last_value_from_parameters
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin
+from django.utils.translation import gettext_lazy as _
 from .models import User, Project, TimeEntry
+from .pagination import EstimatedCountPaginator
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Foreign key list filter picking the related object with the autocomplete
+    widget, instead of listing every user or project in the sidebar like
+    RelatedFieldListFilter. The related model's admin needs search_fields.
+    """
+    template = 'admin/api/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = get_last_value_from_parameters(params, self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.admin_site = model_admin.admin_site
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        clear_url = changelist.get_query_string(remove=[self.lookup_kwarg])
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': clear_url,
+            'display': _('All'),
+        }
+        field = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(self.field, self.admin_site, attrs={
+                'class': 'admin-autocomplete-filter',
+                'data-lookup': self.lookup_kwarg,
+                'data-clear-url': clear_url,
+            }),
+        )
+        yield {
+            'selected': self.lookup_val is not None,
+            # Only the selected object is loaded, the others come from the autocomplete view
+            'widget': field.widget.render(self.lookup_kwarg, self.lookup_val),
+        }
+
+
+class LargeTableAdminMixin:
+    """
+    Changelist settings for tables too large to count or scan: counts from
+    planner estimates, no unfiltered total next to filtered results, no
+    filter facet counts, and the media of AutocompleteFilter. A search term
+    that is a number finds the row with that id.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    @property
+    def media(self):
+        media = super().media
+        if any(isinstance(spec, tuple) and issubclass(spec[1], AutocompleteFilter) for spec in self.list_filter):
+            media += AutocompleteSelect(None, self.admin_site).media
+            media += forms.Media(js=['api/admin/autocomplete_filter.js'])
+        return media
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term.isdigit() and int(term) < 2 ** 63:
+            return queryset.filter(pk=int(term)), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
     """Custom User admin with email verification fields"""
     list_display = ('email', 'username', 'first_name', 'last_name', 'is_email_verified', 'is_active', 'date_joined')
     list_filter = ('is_email_verified', 'is_active', 'is_staff', 'date_joined')
-    search_fields = ('email', 'username', 'first_name', 'last_name')
+    # Prefix searches, served by the UPPER(column) indexes of migration 0008
+    search_fields = ('^email', '^username')
     ordering = ('-date_joined',)
     
     fieldsets = UserAdmin.fieldsets + (
         ('Email Verification', {'fields': ('is_email_verified', 'email_verification_token')}),
+        ('Preferences', {'fields': ('timezone',)}),
     )
     
     readonly_fields = ('email_verification_token', 'date_joined', 'last_login')
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Project admin with user filtering and search"""
     list_display = ('name', 'user', 'color', 'is_active', 'created_at')
-    list_filter = ('is_active', 'created_at', 'user')
-    search_fields = ('name', 'description', 'user__email', 'user__username')
+    list_filter = ('is_active', 'created_at', ('user', AutocompleteFilter))
+    search_fields = ('^name',)
+    autocomplete_fields = ('user',)
     ordering = ('-created_at',)
     
     fieldsets = (
@@ -43,14 +117,20 @@ class ProjectAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ('created_at', 'updated_at')
+    
+    def get_queryset(self, request):
+        """Project.__str__ shows the user's email"""
+        return super().get_queryset(request).select_related('user')
 
 
 @admin.register(TimeEntry)
-class TimeEntryAdmin(admin.ModelAdmin):
+class TimeEntryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """TimeEntry admin with comprehensive display and filtering"""
     list_display = ('user', 'project', 'description_short', 'start_time', 'end_time', 'duration_formatted', 'status')
-    list_filter = ('status', 'start_time', 'project', 'user')
-    search_fields = ('description', 'user__email', 'user__username', 'project__name')
+    list_filter = ('status', 'start_time', ('user', AutocompleteFilter), ('project', AutocompleteFilter))
+    # Descriptions are not searched: no index serves a substring match on them
+    search_fields = ('^user__email',)
+    autocomplete_fields = ('user', 'project')
     ordering = ('-start_time',)
     
     fieldsets = (
@@ -77,4 +157,4 @@ class TimeEntryAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         """Optimize queries with select_related"""
-        return super().get_queryset(request).select_related('user', 'project')
\ No newline at end of file
+        return super().get_queryset(request).select_related('user', 'project__user')
\ No newline at end of file
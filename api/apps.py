@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+    
+    def ready(self):
+        from django.db.models.signals import pre_migrate
+        from . import metrics, signals, tasks  # noqa: F401
+        from .partitioning import check_migration_plan
+        pre_migrate.connect(check_migration_plan, sender=self)
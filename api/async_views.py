@@ -0,0 +1,246 @@
+"""
+Async versions of the hot endpoints, for the ASGI deployment. They skip
+DRF (which only runs sync views) and read with the async ORM, but
+authenticate with the same JWTs and return the same JSON as their
+counterparts in views.py. Starting and stopping a timer are single raw SQL
+statements, which Django can only run synchronously: those run in a thread
+through sync_to_async.
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .auth_views import login_data
+from .authentication import token_mode, token_user_id
+from .cache import aget_user_timezone
+from .dashboard import asummary_totals, split_entries, summary_data, summary_entries
+from .events import get_broker, publish_event
+from .models import Project, TimeEntry, User
+from .renderers import FastJSONRenderer
+from .serializers import (
+    LoginSerializer, StartTimerSerializer, StopTimerSerializer, TimeEntrySerializer, time_entry_rows_data
+)
+from .tokens import RefreshToken
+from .throttling import throttle
+
+# Seconds between keep-alive comments on an idle event stream
+HEARTBEAT_INTERVAL = 20
+
+
+async def authenticate(request):
+    """
+    Return the id of the active user whose access token is in the
+    Authorization header, or in ?access_token= since browser EventSource
+    cannot send headers. Returns None if there is no valid token.
+    """
+    authentication = JWTAuthentication()
+    try:
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else request.GET.get('access_token')
+        if not raw_token:
+            return None
+        token = authentication.get_validated_token(raw_token)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+
+    if token_mode():
+        try:
+            return await sync_to_async(token_user_id)(token)
+        except (AuthenticationFailed, InvalidToken):
+            return None
+
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    # Also normalises the claim, which holds the id as a string
+    return await User.objects.filter(
+        **{jwt_settings.USER_ID_FIELD: user_id}, is_active=True
+    ).values_list('pk', flat=True).afirst()
+
+
+def unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+def render(data, status=200):
+    """Render like the DRF views so both versions return identical bodies"""
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def parse_body(request, serializer_class):
+    """
+    Run the field validation of `serializer_class` on the JSON body. Returns
+    (validated_data, errors); checks that need the database are left to the view.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None, {'detail': 'JSON parse error'}
+    try:
+        return serializer_class().to_internal_value(data), None
+    except serializers.ValidationError as exc:
+        return None, exc.detail
+
+
+@throttle('login')
+@csrf_exempt
+@require_POST
+async def login(request):
+    """
+    Login user and return JWT tokens. The password is verified on the
+    hashing pool (or a worker thread) without holding up the event loop.
+    """
+    data, errors = parse_body(request, LoginSerializer)
+    if errors:
+        return render(errors, status=400)
+    
+    user = await aauthenticate(request, username=data['email'], password=data['password'])
+    if getattr(request, 'password_hashing_busy', False):
+        response = render({'error': 'Too many logins in progress, please retry'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    if user is None:
+        return render({'non_field_errors': ['Invalid credentials']}, status=400)
+    
+    refresh = await sync_to_async(RefreshToken.for_user)(user)
+    return render(login_data(user, refresh))
+
+
+@throttle('timer_status')
+@require_GET
+async def timer_status(request):
+    """
+    Get the current running timer status for the user.
+    """
+    user_id = await authenticate(request)
+    if user_id is None:
+        return unauthorized()
+    
+    running_timer = await TimeEntry.objects.filter(
+        user_id=user_id,
+        status='running',
+        end_time__isnull=True
+    ).for_listing().afirst()
+    
+    if running_timer:
+        return render({'running': True, 'timer': TimeEntrySerializer(running_timer).data})
+    return render({'running': False, 'timer': None})
+
+
+@throttle('timer')
+@csrf_exempt
+@require_POST
+async def start_timer(request):
+    """
+    Start a new timer for a project (or without a project).
+    """
+    user_id = await authenticate(request)
+    if user_id is None:
+        return unauthorized()
+    data, errors = parse_body(request, StartTimerSerializer)
+    if errors:
+        return render(errors, status=400)
+    
+    try:
+        time_entry = await TimeEntry.objects.astart_timer(user_id, data.get('project_id'), data.get('description', ''))
+    except Project.DoesNotExist:
+        return render({'project_id': ["Project not found"]}, status=400)
+    if time_entry is None:
+        return render(
+            {'non_field_errors': ["You already have a running timer. Please stop it first."]},
+            status=400
+        )
+    
+    timer = TimeEntrySerializer(time_entry).data
+    await sync_to_async(publish_event)(user_id, 'timer.started', timer)
+    return render(timer, status=201)
+
+
+@throttle('timer')
+@csrf_exempt
+@require_POST
+async def stop_timer(request):
+    """
+    Stop a running timer.
+    """
+    user_id = await authenticate(request)
+    if user_id is None:
+        return unauthorized()
+    data, errors = parse_body(request, StopTimerSerializer)
+    if errors:
+        return render(errors, status=400)
+    
+    time_entry = await TimeEntry.objects.astop_timer(user_id, data['time_entry_id'])
+    if time_entry is None:
+        return render({'time_entry_id': ["Running time entry not found"]}, status=400)
+    if time_entry.project_id is not None:
+        # Loaded here, the serializer cannot run lazy queries in async code
+        time_entry.project = await Project.objects.only('id', 'name', 'color').aget(pk=time_entry.project_id)
+    
+    timer = TimeEntrySerializer(time_entry).data
+    await sync_to_async(publish_event)(user_id, 'timer.stopped', timer)
+    return render(timer)
+
+
+@require_GET
+async def dashboard_summary(request):
+    """
+    Get time tracking summary for dashboard.
+    """
+    user_id = await authenticate(request)
+    if user_id is None:
+        return unauthorized()
+    
+    tzinfo = await aget_user_timezone(user_id)
+    running_timer, recent_entries = split_entries(time_entry_rows_data([
+        row async for row in summary_entries(user_id)
+    ]))
+    totals = await asummary_totals(user_id, tzinfo)
+    
+    return render(summary_data(running_timer, recent_entries, totals))
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def event_stream(user_id):
+    # Subscribed on first iteration so an unread response never leaks a subscription
+    subscription = get_broker().subscribe(user_id)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            event = await subscription.get(timeout=HEARTBEAT_INTERVAL)
+            # Comments keep proxies from closing an idle connection
+            yield format_event(event) if event is not None else ': keep-alive\n\n'
+    finally:
+        subscription.close()
+
+
+@require_GET
+async def timer_events(request):
+    """
+    Server-Sent Events stream of the authenticated user's timer and project
+    changes (timer.started, timer.stopped, project.created/updated/deleted).
+    Only served by the ASGI application.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would drain the endless stream into a list: held
+        # forever, growing, and never sending anything
+        return JsonResponse({'detail': 'Event streams are only served by the ASGI application.'}, status=501)
+    user_id = await authenticate(request)
+    if user_id is None:
+        return unauthorized()
+
+    response = StreamingHttpResponse(event_stream(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
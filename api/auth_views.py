@@ -2,12 +2,17 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .cache import get_user_is_active
 from .serializers import (
     UserRegistrationSerializer, EmailVerificationSerializer, LoginSerializer
 )
+from .tokens import RefreshToken
+from .throttling import throttle
 
 
+@throttle('register')
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
@@ -41,50 +46,89 @@ def verify_email(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@throttle('login')
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login(request):
     """
     Login user and return JWT tokens.
     """
-    serializer = LoginSerializer(data=request.data)
+    serializer = LoginSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         user = serializer.validated_data['user']
         refresh = RefreshToken.for_user(user)
-        return Response({
-            'message': 'Login successful',
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'is_email_verified': user.is_email_verified
-            },
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
-        }, status=status.HTTP_200_OK)
+        return Response(login_data(user, refresh), status=status.HTTP_200_OK)
+    if getattr(request, 'password_hashing_busy', False):
+        return busy_response()
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def login_data(user, refresh):
+    return {
+        'message': 'Login successful',
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'is_email_verified': user.is_email_verified,
+            'timezone': user.timezone
+        },
+        'tokens': {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    }
+
+
+def busy_response():
+    # Every password verification slot is taken, ask the client to retry shortly
+    response = Response({'error': 'Too many logins in progress, please retry'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '1'
+    return response
+
+
+@throttle('refresh')
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def refresh_token(request):
     """
-    Refresh JWT token.
+    Exchange a refresh token for a new access token and a new refresh token.
+    The old refresh token is blacklisted, so each one can only be used once.
     """
+    refresh_token = request.data.get('refresh')
+    if not refresh_token:
+        return Response({'error': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
     try:
-        refresh_token = request.data.get('refresh')
-        if not refresh_token:
-            return Response({'error': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
-        
+        # Verifies the signature, expiry and (through the revocation cache) the blacklist
         token = RefreshToken(refresh_token)
-        new_access_token = str(token.access_token)
-        
-        return Response({
-            'access': new_access_token,
-            'refresh': str(token)
-        }, status=status.HTTP_200_OK)
+        if not get_user_is_active(token[jwt_settings.USER_ID_CLAIM]):
+            raise TokenError('User is inactive')
+        token = token.rotate()
+    except TokenError:
+        return Response({'error': 'Invalid refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    except Exception as e:
+    return Response({
+        'access': str(token.access_token),
+        'refresh': str(token)
+    }, status=status.HTTP_200_OK)
+
+
+@throttle('refresh')
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def logout(request):
+    """
+    Revoke a refresh token so it can no longer be exchanged for new tokens.
+    Access tokens already issued stay valid until they expire.
+    """
+    refresh_token = request.data.get('refresh')
+    if not refresh_token:
+        return Response({'error': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        RefreshToken(refresh_token).blacklist()
+    except TokenError:
         return Response({'error': 'Invalid refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response(status=status.HTTP_204_NO_CONTENT)
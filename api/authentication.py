@@ -0,0 +1,60 @@
+"""
+JWT authentication for the API views.
+
+In the default 'database' mode request.user is loaded from the database on
+every request, as simplejwt does. The views only need the user's id, so
+with API_AUTH_USER_MODE = 'token' request.user is instead a TokenUser built
+from the access token's claims, without a query. The user's active flag is
+then checked against the cache (API_AUTH_ACTIVE_CACHE_TTL seconds, 0 skips
+the check and trusts the token until it expires).
+"""
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication, models
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .cache import get_user_is_active
+
+AUTH_USER_MODES = ('database', 'token')
+
+
+class TokenUser(models.TokenUser):
+    """A user backed by an access token, whose id is the integer primary key"""
+
+    @cached_property
+    def id(self):
+        # The claim holds the id as a string
+        return int(self.token[jwt_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+
+def token_user_id(validated_token):
+    """
+    Return the id of the user a validated token was issued to, checking
+    that they are still active (through the cache) in token mode.
+    """
+    if jwt_settings.USER_ID_CLAIM not in validated_token:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+    user_id = TokenUser(validated_token).id
+    if settings.API_AUTH_ACTIVE_CACHE_TTL and not get_user_is_active(user_id):
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    return user_id
+
+
+def token_mode():
+    # Read on every request, so the mode can be switched in tests and benchmarks
+    return settings.API_AUTH_USER_MODE == 'token'
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """JWT authentication honouring API_AUTH_USER_MODE"""
+
+    def get_user(self, validated_token):
+        if not token_mode():
+            return super().get_user(validated_token)
+        token_user_id(validated_token)
+        return TokenUser(validated_token)
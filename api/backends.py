@@ -0,0 +1,77 @@
+from django.contrib.auth import backends, get_user_model, hashers
+from .hashers import PasswordHashingBusy, arun_hashing, run_hashing
+
+UserModel = get_user_model()
+
+
+class ModelBackend(backends.ModelBackend):
+    """
+    Django's ModelBackend with password verification run through the
+    hashing pool (see api.hashers), and outdated hashes upgraded to the
+    preferred hasher and work factor after a successful login.
+
+    When the pool is full the login fails like a wrong password would, so
+    callers such as the admin login form do not crash, and the request gets
+    `password_hashing_busy = True` for the API login views to answer 503.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so the response time does not reveal which users exist
+            try:
+                run_hashing(hashers.make_password, password)
+            except PasswordHashingBusy:
+                return self.busy(request)
+            return None
+        try:
+            is_correct, must_update = run_hashing(hashers.verify_password, password, user.password)
+        except PasswordHashingBusy:
+            return self.busy(request)
+        if not (is_correct and self.user_can_authenticate(user)):
+            return None
+        if must_update:
+            try:
+                user.password = run_hashing(hashers.make_password, password)
+            except PasswordHashingBusy:
+                # Upgrade on a later login rather than refuse this one
+                return user
+            user.save(update_fields=['password'])
+        return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            try:
+                await arun_hashing(hashers.make_password, password)
+            except PasswordHashingBusy:
+                return self.busy(request)
+            return None
+        try:
+            is_correct, must_update = await arun_hashing(hashers.verify_password, password, user.password)
+        except PasswordHashingBusy:
+            return self.busy(request)
+        if not (is_correct and self.user_can_authenticate(user)):
+            return None
+        if must_update:
+            try:
+                user.password = await arun_hashing(hashers.make_password, password)
+            except PasswordHashingBusy:
+                return user
+            await user.asave(update_fields=['password'])
+        return user
+
+    def busy(self, request):
+        if request is not None:
+            request.password_hashing_busy = True
+        return None
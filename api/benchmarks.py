@@ -0,0 +1,501 @@
+"""
+Benchmark scenarios run by `manage.py benchmark`. Every scenario runs in a
+throwaway test database, seeds its own data and returns a JSON-serialisable
+dict of results.
+"""
+import asyncio
+import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.renderers import JSONRenderer
+from .models import TimeEntry, User
+from .renderers import FastJSONRenderer, orjson
+from .seeding import seed
+from .serializers import TimeEntrySerializer, time_entry_rows_data
+from .tokens import RefreshToken
+
+SCENARIOS = {}
+
+# Password of the users seeded by the scenarios
+BENCHMARK_PASSWORD = 'benchmark'
+
+
+def scenario(name):
+    """Register a benchmark scenario under `name`"""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """Run the block against a test database, like the test runner does"""
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        # An in-memory database cannot be shared by the threads serving sync views
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark.sqlite3')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        # Measure the endpoints, not the rate limits
+        with override_settings(API_THROTTLE_RATES={}):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def auth_headers(user):
+    return {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+
+def summarize(latencies, elapsed=None):
+    """Throughput and latency percentiles (milliseconds) of a run, throughput only if `elapsed` is given"""
+    latencies = sorted(latencies)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    summary = {'requests': len(latencies)}
+    if elapsed is not None:
+        summary['requests_per_second'] = round(len(latencies) / elapsed, 1)
+    summary.update({
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+    })
+    return summary
+
+
+async def run_concurrently(workers, requests_per_worker, make_request):
+    """
+    Run `workers` tasks that each await `make_request(worker)` in a loop and
+    return the summary of all request latencies.
+    """
+    latencies = []
+
+    async def worker(index):
+        for _ in range(requests_per_worker):
+            started = time.perf_counter()
+            await make_request(index)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(workers)))
+    elapsed = time.perf_counter() - started
+    # The ORM calls of async views share one sync thread that outlives the run;
+    # close its connection so it does not point at a later scenario's dropped database
+    await sync_to_async(connections.close_all)()
+    return summarize(latencies, elapsed)
+
+
+def queries_of(response):
+    """The query count reported by PerformanceMiddleware in Server-Timing"""
+    match = re.search(r'desc="(\d+) queries"', response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def timed(name, method, *args, expected=200, **kwargs):
+    """Make a request; return (name, response, seconds) and check its status"""
+    started = time.perf_counter()
+    response = method(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    assert response.status_code == expected, (name, response.status_code, response.content[:500])
+    return name, response, elapsed
+
+
+def run_threads(workers, requests_per_worker, steps):
+    """
+    Run `workers` threads, each with its own client and database connection,
+    that call `steps(client, worker, iteration)` `requests_per_worker` times.
+    Each call yields timed() results. Returns the throughput of the whole
+    run, and the latencies and average queries per request of each request
+    name: the requests of one name share the run with the others, so they
+    have no throughput of their own.
+    """
+    samples = defaultdict(list)
+    lock = threading.Lock()
+
+    def worker(index):
+        client = Client()
+        try:
+            for iteration in range(requests_per_worker):
+                for name, response, elapsed in steps(client, index, iteration):
+                    with lock:
+                        samples[name].append((elapsed, queries_of(response)))
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(worker, range(workers)))
+    elapsed = time.perf_counter() - started
+    requests = sum(len(values) for values in samples.values())
+    return {
+        'requests': requests,
+        'requests_per_second': round(requests / elapsed, 1),
+        'endpoints': {
+            name: {
+                **summarize([latency for latency, queries in values]),
+                'queries_per_request': round(statistics.mean(queries or 0 for latency, queries in values), 2),
+            }
+            for name, values in samples.items()
+        },
+    }
+
+
+@scenario('async-views')
+def async_views(options):
+    """
+    Compare the DRF views with their async versions under concurrent load,
+    both served in-process by the ASGI handler.
+    """
+    seed(options['concurrency'], options['entries'], password=BENCHMARK_PASSWORD)
+    users = list(User.objects.order_by('id'))
+    headers = [auth_headers(user) for user in users]
+    client = AsyncClient()
+    requests_per_worker = max(1, options['requests'] // options['concurrency'])
+
+    def get(url):
+        async def make_request(worker):
+            response = await client.get(url, headers=headers[worker])
+            assert response.status_code == 200, response.content
+        return make_request
+
+    def start_stop(prefix):
+        # One request is a start followed by a stop of the same timer
+        async def make_request(worker):
+            response = await client.post(
+                f'{prefix}timer/start/', {}, content_type='application/json', headers=headers[worker]
+            )
+            assert response.status_code == 201, response.content
+            response = await client.post(
+                f'{prefix}timer/stop/', {'time_entry_id': response.json()['id']},
+                content_type='application/json', headers=headers[worker]
+            )
+            assert response.status_code == 200, response.content
+        return make_request
+
+    results = {}
+    for name, make_request in [
+        ('timer_status', lambda prefix: get(f'{prefix}timer/status/')),
+        ('dashboard', lambda prefix: get(f'{prefix}dashboard/')),
+        ('timer_start_stop', start_stop),
+    ]:
+        results[name] = {
+            'sync': asyncio.run(run_concurrently(options['concurrency'], requests_per_worker, make_request('/api/'))),
+            'async': asyncio.run(run_concurrently(options['concurrency'], requests_per_worker, make_request('/api/async/'))),
+        }
+    return results
+
+
+def count_queries(make_request):
+    """Run `make_request()` once and return the number of queries it ran"""
+    queries = []
+    with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+        make_request()
+    return len(queries)
+
+
+@scenario('dashboard-scale')
+def dashboard_scale(options):
+    """
+    Dashboard latency for one user with a growing number of time entries
+    (--scales), which should stay flat since it only reads the rollups and
+    the most recent entries.
+    """
+    client = Client()
+    results = {}
+    for entries in options['scales']:
+        seed(1, entries, prefix=f'scale{entries}-')
+        user = User.objects.get(username=f'scale{entries}-0')
+        headers = auth_headers(user)
+        queries = count_queries(lambda: client.get('/api/dashboard/', headers=headers))
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            request_started = time.perf_counter()
+            client.get('/api/dashboard/', headers=headers)
+            latencies.append(time.perf_counter() - request_started)
+        results[str(entries)] = {
+            'queries': queries,
+            **summarize(latencies, time.perf_counter() - started),
+        }
+    return results
+
+
+@scenario('connections')
+def connections_reuse(options):
+    """
+    Latency of one request at a time with a new database connection per
+    request, with a persistent connection, and with the configured
+    DATABASES settings (e.g. a pool). The test client never closes
+    connections, so this closes them around each request like the request
+    handler does.
+    """
+    seed(1, options['entries'])
+    user = User.objects.get()
+    headers = auth_headers(user)
+    client = Client()
+    opened = []
+
+    def count_connection(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    configured = connection.settings_dict['CONN_MAX_AGE']
+    results = {}
+    connection_created.connect(count_connection)
+    try:
+        for mode, max_age in (('per-request', 0), ('persistent', 600), ('configured', configured)):
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+            opened.clear()
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                request_started = time.perf_counter()
+                close_old_connections()
+                client.get('/api/timer/status/', headers=headers)
+                close_old_connections()
+                latencies.append(time.perf_counter() - request_started)
+            results[mode] = {
+                'conn_max_age': max_age,
+                'connections_opened': len(opened),
+                **summarize(latencies, time.perf_counter() - started),
+            }
+    finally:
+        connection_created.disconnect(count_connection)
+        connection.settings_dict['CONN_MAX_AGE'] = configured
+    results['configured']['pool'] = 'pool' in connection.settings_dict.get('OPTIONS', {})
+    return results
+
+
+@scenario('serialization')
+def serialization(options):
+    """
+    Serialize and render 1,000 entries with TimeEntrySerializer and
+    JSONRenderer, and with .values() rows, time_entry_rows_data() and
+    FastJSONRenderer. Both must produce the same bytes. The query is run
+    beforehand, so this only measures the Python side.
+    """
+    seed(1, 1000)
+    user = User.objects.get()
+    entries = TimeEntry.objects.filter(user=user).order_by('-start_time', '-id')
+    instances = list(entries.for_listing())
+    rows = list(entries.listing_values())
+    repeats = max(1, options['requests'] // 10)
+
+    def measure(func):
+        latencies = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - started)
+        return round(statistics.median(latencies) * 1000, 2)
+
+    model_serializer = lambda: JSONRenderer().render(TimeEntrySerializer(instances, many=True).data)
+    values_rows = lambda: FastJSONRenderer().render(time_entry_rows_data(rows))
+    if model_serializer() != values_rows():
+        raise AssertionError('time_entry_rows_data() and FastJSONRenderer output differs from TimeEntrySerializer')
+    results = {
+        'entries': len(rows),
+        'orjson': orjson is not None,
+        'model_serializer_ms': measure(model_serializer),
+        'values_rows_ms': measure(values_rows),
+        'serialize_only': {
+            'model_serializer_ms': measure(lambda: TimeEntrySerializer(instances, many=True).data),
+            'values_rows_ms': measure(lambda: time_entry_rows_data(rows)),
+        },
+        # Model instances are built when the queryset is evaluated
+        'fetch': {
+            'instances_ms': measure(lambda: list(entries.for_listing())),
+            'values_ms': measure(lambda: list(entries.listing_values())),
+        },
+    }
+    results['speedup'] = round(results['model_serializer_ms'] / results['values_rows_ms'], 1)
+    return results
+
+
+@scenario('token-auth')
+def token_auth(options):
+    """
+    Queries per request and throughput of the timer endpoints with
+    request.user loaded from the database and built from the token.
+    """
+    seed(options['concurrency'], options['entries'], password=BENCHMARK_PASSWORD)
+    users = list(User.objects.order_by('id'))
+    headers = [auth_headers(user) for user in users]
+    client = Client()
+    async_client = AsyncClient()
+    requests_per_worker = max(1, options['requests'] // options['concurrency'])
+
+    def start_stop(worker):
+        response = client.post('/api/timer/start/', {}, content_type='application/json', headers=headers[worker])
+        assert response.status_code == 201, response.content
+        return client.post(
+            '/api/timer/stop/', {'time_entry_id': response.json()['id']},
+            content_type='application/json', headers=headers[worker]
+        )
+
+    async def timer_status(worker):
+        response = await async_client.get('/api/timer/status/', headers=headers[worker])
+        assert response.status_code == 200, response.content
+
+    async def timer_start_stop(worker):
+        response = await async_client.post(
+            '/api/timer/start/', {}, content_type='application/json', headers=headers[worker]
+        )
+        assert response.status_code == 201, response.content
+        response = await async_client.post(
+            '/api/timer/stop/', {'time_entry_id': response.json()['id']},
+            content_type='application/json', headers=headers[worker]
+        )
+        assert response.status_code == 200, response.content
+
+    results = {}
+    for mode in ('database', 'token'):
+        with override_settings(API_AUTH_USER_MODE=mode):
+            # Warm the active flag cache and today's rollup, then count steady-state queries
+            start_stop(0)
+            results[mode] = {
+                'timer_status': {
+                    'queries': count_queries(lambda: client.get('/api/timer/status/', headers=headers[0])),
+                    **asyncio.run(run_concurrently(options['concurrency'], requests_per_worker, timer_status)),
+                },
+                'timer_start_stop': {
+                    'queries': count_queries(lambda: start_stop(0)),
+                    **asyncio.run(run_concurrently(options['concurrency'], requests_per_worker, timer_start_stop)),
+                },
+            }
+    return results
+
+
+@scenario('login')
+def login(options):
+    """
+    Login throughput and CPU time per login for each password hasher,
+    through the sync view on `--concurrency` threads and through the async
+    view verifying on the thread pool.
+    """
+    seed(options['concurrency'], 0, password=BENCHMARK_PASSWORD)
+    users = list(User.objects.order_by('id'))
+    credentials = [{'email': user.email, 'password': BENCHMARK_PASSWORD} for user in users]
+    requests_per_worker = max(1, options['requests'] // options['concurrency'])
+    hashers = {
+        name: [path for path in settings.PASSWORD_HASHERS if name in path.lower()] + [
+            path for path in settings.PASSWORD_HASHERS if name not in path.lower()
+        ]
+        for name in ('pbkdf2', 'argon2')
+    }
+
+    def sync_logins(worker):
+        client = Client()
+        for _ in range(requests_per_worker):
+            started = time.perf_counter()
+            response = client.post('/api/auth/login/', credentials[worker], content_type='application/json')
+            assert response.status_code == 200, response.content
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    async_client = AsyncClient()
+
+    async def async_login(worker):
+        response = await async_client.post('/api/async/auth/login/', credentials[worker], content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    results = {'cpu_count': os.cpu_count()}
+    for name, password_hashers in hashers.items():
+        with override_settings(PASSWORD_HASHERS=password_hashers):
+            User.objects.filter(pk__in=[user.pk for user in users]).update(password=make_password(BENCHMARK_PASSWORD))
+            results[name] = {}
+
+            latencies = []
+            cpu_started, started = time.process_time(), time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                list(executor.map(sync_logins, range(options['concurrency'])))
+            cpu_seconds = time.process_time() - cpu_started
+            results[name]['sync'] = {
+                **summarize(latencies, time.perf_counter() - started),
+                'cpu_ms_per_login': round(cpu_seconds * 1000 / len(latencies), 2),
+                'logins_per_core_second': round(len(latencies) / cpu_seconds, 1),
+            }
+
+            with override_settings(API_PASSWORD_HASHING_POOL='thread'):
+                cpu_started = time.process_time()
+                summary = asyncio.run(run_concurrently(options['concurrency'], requests_per_worker, async_login))
+                cpu_seconds = time.process_time() - cpu_started
+            results[name]['async_pool'] = {
+                **summary,
+                'cpu_ms_per_login': round(cpu_seconds * 1000 / summary['requests'], 2),
+                'logins_per_core_second': round(summary['requests'] / cpu_seconds, 1),
+            }
+    return results
+
+
+@scenario('load')
+def load(options):
+    """
+    Seed --users users with --entries entries each, then drive the main
+    endpoints from --concurrency threads: logins, then the read endpoints,
+    then timer start/stop. Each iteration of a worker uses another user, so
+    concurrent workers never share one.
+    """
+    workers = options['concurrency']
+    if options['users'] < workers:
+        raise ValueError('--users must be at least --concurrency')
+    started = time.perf_counter()
+    seed(options['users'], options['entries'], password=BENCHMARK_PASSWORD)
+    users = list(User.objects.order_by('id'))
+    headers = [auth_headers(user) for user in users]
+    seed_seconds = time.perf_counter() - started
+    requests_per_worker = max(1, options['requests'] // workers)
+
+    def user_index(worker, iteration):
+        return (worker + iteration * workers) % len(users)
+
+    def logins(client, worker, iteration):
+        user = users[user_index(worker, iteration)]
+        yield timed('login', client.post, '/api/auth/login/', {
+            'email': user.email, 'password': BENCHMARK_PASSWORD
+        }, content_type='application/json')
+
+    def reads(client, worker, iteration):
+        user_headers = headers[user_index(worker, iteration)]
+        yield timed('timer_status', client.get, '/api/timer/status/', headers=user_headers)
+        yield timed('time_entries', client.get, '/api/time-entries/', headers=user_headers)
+        yield timed('dashboard', client.get, '/api/dashboard/', headers=user_headers)
+
+    def timer(client, worker, iteration):
+        user_headers = headers[user_index(worker, iteration)]
+        name, response, elapsed = timed(
+            'timer_start', client.post, '/api/timer/start/', {},
+            content_type='application/json', headers=user_headers, expected=201
+        )
+        yield name, response, elapsed
+        yield timed('timer_stop', client.post, '/api/timer/stop/', {
+            'time_entry_id': response.json()['id']
+        }, content_type='application/json', headers=user_headers)
+
+    results = {'seed': {
+        'users': len(users),
+        'entries': len(users) * options['entries'],
+        'seconds': round(seed_seconds, 2),
+    }}
+    with override_settings(API_SERVER_TIMING=True):
+        # Password hashing makes logins much slower, run fewer of them
+        results['logins'] = run_threads(workers, max(1, requests_per_worker // 10), logins)
+        results['reads'] = run_threads(workers, requests_per_worker, reads)
+        results['timer'] = run_threads(workers, requests_per_worker, timer)
+    return results
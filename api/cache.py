@@ -0,0 +1,115 @@
+import hashlib
+from functools import wraps
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+USER_VERSION_KEY = 'api:user-version:{}'
+USER_TIMEZONE_KEY = 'api:user-timezone:{}'
+USER_ACTIVE_KEY = 'api:user-active:{}'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def get_user_version(user_id):
+    """
+    Return an opaque stamp that changes whenever the user's projects or time
+    entries change. A missing stamp (new user, cache flush) is initialised
+    with a fresh value, so old ETags can never match again.
+    """
+    cache = get_cache()
+    key = USER_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    """Invalidate the user's ETags once the current transaction commits"""
+    key = USER_VERSION_KEY.format(user_id)
+    transaction.on_commit(lambda: get_cache().set(key, uuid4().hex, timeout=None))
+
+
+def get_user_timezone(user_id):
+    """
+    Return the ZoneInfo the user's days are counted in. The name is cached,
+    so code that only has a user id does not need a query to find it.
+    """
+    cache = get_cache()
+    key = USER_TIMEZONE_KEY.format(user_id)
+    name = cache.get(key)
+    if name is None:
+        from .models import User
+        name = User.objects.filter(pk=user_id).values_list('timezone', flat=True).first() or 'UTC'
+        cache.set(key, name, timeout=None)
+    return ZoneInfo(name)
+
+
+aget_user_timezone = sync_to_async(get_user_timezone)
+
+
+def set_user_timezone(user_id, name):
+    """Update the cached timezone name once the current transaction commits"""
+    key = USER_TIMEZONE_KEY.format(user_id)
+    transaction.on_commit(lambda: get_cache().set(key, name, timeout=None))
+
+
+def get_user_is_active(user_id):
+    """
+    Return whether the user exists and is active, cached for
+    API_AUTH_ACTIVE_CACHE_TTL seconds.
+    """
+    cache = get_cache()
+    key = USER_ACTIVE_KEY.format(user_id)
+    is_active = cache.get(key)
+    if is_active is None:
+        from .models import User
+        is_active = bool(User.objects.filter(pk=user_id).values_list('is_active', flat=True).first())
+        cache.set(key, is_active, timeout=settings.API_AUTH_ACTIVE_CACHE_TTL)
+    return is_active
+
+
+def forget_user_is_active(user_id):
+    """Drop the cached active flag once the current transaction commits"""
+    key = USER_ACTIVE_KEY.format(user_id)
+    transaction.on_commit(lambda: get_cache().delete(key))
+
+
+def user_version_etag(request, *args, **kwargs):
+    if not request.user.is_authenticated:
+        return None
+    # The URL arguments and query string select different content: /projects/1/ and
+    # /projects/2/, or reports of other dates, must not validate each other's copies
+    path = hashlib.blake2b(request.get_full_path().encode(), digest_size=8).hexdigest()
+    return f'{request.resolver_match.url_name}-{path}-{get_user_version(request.user.id)}'
+
+
+def conditional_on_user_version(view):
+    """
+    Answer If-None-Match on GET and HEAD with 304 Not Modified, before the
+    view runs any query, while the user's version stamp is unchanged. Writes
+    to the same view are not conditional (a client resending its ETag would
+    get 412). Must be placed below @api_view so that request.user is the
+    authenticated user.
+    """
+    conditional_view = condition(etag_func=user_version_etag)(view)
+    
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        response = conditional_view(request, *args, **kwargs)
+        # The content depends on the user: let clients revalidate, never share it
+        patch_vary_headers(response, ['Authorization'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapped_view
@@ -0,0 +1,90 @@
+"""
+Queries behind the dashboard summary, shared by the sync and async views:
+one query for the running timer together with the recent entries, and one
+conditional aggregate over the daily rollups for the three totals.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import DateTimeField, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import DailyRollup, TimeEntry
+
+RECENT_ENTRIES = 10
+# Lower start_time bound of the recent entries when the user has fewer of them
+EARLIEST = Value(datetime.min.replace(tzinfo=dt_timezone.utc), output_field=DateTimeField())
+
+
+def summary_periods(tzinfo):
+    """Return the first day of today, this week and this month in `tzinfo`"""
+    today = timezone.localdate(timezone=tzinfo)
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    return today, week_start, month_start
+
+
+def summary_entries(user_id):
+    """
+    The user's most recent entries plus the running timer, which is
+    usually among them but may have been started before a later
+    (backdated) entry. Newest first.
+    """
+    entries = TimeEntry.objects.filter(user_id=user_id)
+    recent = entries.order_by('-start_time', '-id')
+    running = entries.filter(status='running', end_time__isnull=True)
+    # Both sides are primary key lookups, filtering the outer query by user
+    # would make it read all of the user's entries. Each also bounds start_time
+    # with a scalar subquery, so that a partitioned table (see api.partitioning)
+    # only probes the partitions holding the rows.
+    oldest_recent = Coalesce(Subquery(recent.values('start_time')[RECENT_ENTRIES - 1:RECENT_ENTRIES]), EARLIEST)
+    return TimeEntry.objects.filter(
+        Q(pk__in=recent.values('pk')[:RECENT_ENTRIES], start_time__gte=oldest_recent)
+        # There is at most one running timer
+        | Q(pk=Subquery(running.values('pk')[:1]), start_time=Subquery(running.values('start_time')[:1]))
+    ).listing_values().order_by('-start_time', '-id')
+
+
+def split_entries(entries):
+    """
+    Split the serialized rows of summary_entries() (see
+    serializers.time_entry_rows_data) into (running_timer, recent_entries)
+    """
+    running_timer = next((entry for entry in entries if entry['is_running']), None)
+    return running_timer, entries[:RECENT_ENTRIES]
+
+
+def _totals_query(user_id, tzinfo):
+    today, week_start, month_start = summary_periods(tzinfo)
+    queryset = DailyRollup.objects.filter(user_id=user_id, day__gte=min(week_start, month_start))
+    return queryset, {
+        'today': Sum('total_seconds', filter=Q(day__gte=today), default=0),
+        'week': Sum('total_seconds', filter=Q(day__gte=week_start), default=0),
+        'month': Sum('total_seconds', filter=Q(day__gte=month_start), default=0),
+    }
+
+
+def summary_totals(user_id, tzinfo):
+    """Seconds tracked today, this week and this month, in one aggregate"""
+    queryset, totals = _totals_query(user_id, tzinfo)
+    return queryset.aggregate(**totals)
+
+
+async def asummary_totals(user_id, tzinfo):
+    queryset, totals = _totals_query(user_id, tzinfo)
+    return await queryset.aaggregate(**totals)
+
+
+def format_duration(seconds):
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    return f"{hours}h {minutes}m"
+
+
+def summary_data(running_timer, recent_entries, totals):
+    """The dashboard summary response"""
+    return {
+        'total_time_today': format_duration(totals['today']),
+        'total_time_this_week': format_duration(totals['week']),
+        'total_time_this_month': format_duration(totals['month']),
+        'running_timer': running_timer,
+        'recent_entries': recent_entries
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+# Events kept for a subscriber that is not reading; later ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """Events published for one user, read by one event stream"""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        """Hand an event over from any thread"""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout=None):
+        """Wait for the next event, or return None after `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """
+    Delivers events to the streams open in this process. An idle stream
+    only costs a queue and a suspended coroutine, so one worker can hold
+    thousands of them. Only works when a single process publishes and
+    streams, use RedisBroker to fan out across workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, user_id):
+        """Must be called from the event loop that will read the subscription"""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        self.dispatch(user_id, event)
+
+    def dispatch(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+
+class RedisBroker(InMemoryBroker):
+    """
+    Publishes through Redis pub/sub so every worker receives every event.
+    Each process holds one pattern subscription, started on the first
+    stream, and dispatches to its local streams.
+    """
+    channel_prefix = 'api:events:'
+
+    def __init__(self, url=None):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker requires the redis package.')
+        self.url = url or getattr(settings, 'EVENTS_REDIS_URL', None)
+        if not self.url:
+            raise ImproperlyConfigured('RedisBroker requires EVENTS_REDIS_URL.')
+        self._client = redis.Redis.from_url(self.url)
+        self._listener = None
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self._listener is None or self._listener.done():
+            self._listener = subscription.loop.create_task(self._listen())
+        return subscription
+
+    def publish(self, user_id, event):
+        self._client.publish(f'{self.channel_prefix}{user_id}', json.dumps(event))
+
+    async def _listen(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.psubscribe(f'{self.channel_prefix}*')
+        try:
+            async for message in pubsub.listen():
+                user_id = int(message['channel'].decode().removeprefix(self.channel_prefix))
+                self.dispatch(user_id, json.loads(message['data']))
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENTS_BROKER)()
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    if setting == 'EVENTS_BROKER':
+        get_broker.cache_clear()
+
+
+def publish_event(user_id, event_type, data):
+    """Publish an event to the user's streams once the current transaction commits"""
+    event = {'type': event_type, 'data': data}
+    # The change is already saved: a broker error is logged, not turned into a 500
+    transaction.on_commit(lambda: get_broker().publish(user_id, event), robust=True)
@@ -0,0 +1,163 @@
+import csv
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+
+# (header, values_list() lookup) of each exported column
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('project_id', 'project_id'),
+    ('project_name', 'project__name'),
+    ('description', 'description'),
+    ('start_time', 'start_time'),
+    ('end_time', 'end_time'),
+    ('duration_seconds', 'duration_seconds'),
+    ('status', 'status'),
+]
+EXPORT_CHUNK_SIZE = 2000
+# Rows joined into each chunk written to the response
+LINES_PER_WRITE = 500
+# Starts of CSV cells that spreadsheets read as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+    def write(self, value):
+        return value
+
+
+def format_datetime(value):
+    """ISO 8601 like the API's JSON output, None for missing values"""
+    if value is None:
+        return None
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def export_values(queryset):
+    """The entries as values_list() tuples in EXPORT_COLUMNS order, oldest first"""
+    return queryset.order_by('start_time', 'id').values_list(*[lookup for header, lookup in EXPORT_COLUMNS])
+
+
+def export_row(values):
+    entry_id, project_id, project_name, description, start_time, end_time, duration, entry_status = values
+    return (
+        entry_id, project_id, project_name, description,
+        format_datetime(start_time), format_datetime(end_time), duration, entry_status
+    )
+
+
+def export_rows(queryset):
+    """
+    Iterate the entries as export rows. They are read in chunks from a
+    server-side cursor where the database supports it, so memory use does
+    not grow with the export size.
+    """
+    for values in export_values(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield export_row(values)
+
+
+async def aexport_rows(queryset):
+    """
+    export_rows() for async code, fetching a chunk per thread switch. The
+    calls share one thread, so the server-side cursor stays on its
+    connection. (values_list().aiterator() runs the query in the event loop.)
+    """
+    rows = export_rows(queryset)
+    next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+    try:
+        while chunk := await next_chunk():
+            for row in chunk:
+                yield row
+    finally:
+        # Closes the cursor when the client goes away mid-export
+        await sync_to_async(rows.close)()
+
+
+def buffered(lines):
+    """Join lines into larger chunks so the server does not write row by row"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= LINES_PER_WRITE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def abuffered(lines):
+    buffer = []
+    async for line in lines:
+        buffer.append(line)
+        if len(buffer) >= LINES_PER_WRITE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def looks_like_formula(value):
+    """Text starting like a formula, after any quotes"""
+    return value.lstrip("'").startswith(FORMULA_PREFIXES)
+
+
+def csv_cell(value):
+    """
+    A CSV cell. Text starting like a formula is prefixed with a quote, so
+    that a spreadsheet shows a description such as =HYPERLINK(...) instead
+    of running it. So is text already quoted that way, so that
+    read_csv_cell() gives back the original text.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str) and looks_like_formula(value):
+        return "'" + value
+    return value
+
+
+def read_csv_cell(value):
+    """The text of a cell written by csv_cell()"""
+    return value[1:] if value.startswith("'") and looks_like_formula(value) else value
+
+
+def csv_format():
+    """(header, function formatting a row) of a CSV export"""
+    writer = csv.writer(Echo())
+    header = writer.writerow([header for header, lookup in EXPORT_COLUMNS])
+    return header, lambda row: writer.writerow([csv_cell(value) for value in row])
+
+
+def ndjson_format():
+    headers = [header for header, lookup in EXPORT_COLUMNS]
+    return None, lambda row: json.dumps(dict(zip(headers, row)), ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'csv': csv_format,
+    'ndjson': ndjson_format,
+}
+
+
+def stream_export(queryset, export_format):
+    """The chunks of an export in `export_format`, for WSGI responses"""
+    header, format_row = FORMATS[export_format]()
+    if header:
+        # Sent before the query runs, so the first byte goes out right away
+        yield header
+    yield from buffered(format_row(row) for row in export_rows(queryset))
+
+
+async def astream_export(queryset, export_format):
+    """
+    stream_export() as an async iterator, for ASGI responses: Django would
+    read a sync iterator into a list before sending any of it.
+    """
+    header, format_row = FORMATS[export_format]()
+    if header:
+        yield header
+    async for chunk in abuffered(format_row(row) async for row in aexport_rows(queryset)):
+        yield chunk
@@ -0,0 +1,109 @@
+"""
+Password hashers with work factors taken from settings, and an optional
+bounded pool that runs password verification off the request thread.
+
+Changing PASSWORD_HASHER or a work factor only affects new hashes: existing
+ones keep verifying and are rehashed with the current settings on the
+user's next successful login.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with the API_ARGON2_* costs"""
+
+    @property
+    def time_cost(self):
+        return settings.API_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.API_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.API_ARGON2_PARALLELISM
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with API_PBKDF2_ITERATIONS iterations"""
+
+    @property
+    def iterations(self):
+        return settings.API_PBKDF2_ITERATIONS
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the verification pool has no room for another password"""
+
+
+class HashingPool:
+    """
+    An executor with at most `workers` hashes running and `queue_size`
+    waiting. Hashing libraries release the GIL, so threads run in parallel;
+    processes also cover hashers that do not.
+    """
+
+    def __init__(self, kind, workers, queue_size):
+        if kind == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        elif kind == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+        else:
+            raise ImproperlyConfigured(f"API_PASSWORD_HASHING_POOL must be 'thread' or 'process', not {kind!r}")
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+
+@lru_cache(maxsize=None)
+def get_hashing_pool():
+    """The process-wide pool, or None to hash on the calling thread"""
+    if not settings.API_PASSWORD_HASHING_POOL:
+        return None
+    return HashingPool(
+        settings.API_PASSWORD_HASHING_POOL,
+        settings.API_PASSWORD_HASHING_WORKERS or os.cpu_count(),
+        settings.API_PASSWORD_HASHING_QUEUE
+    )
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    if setting.startswith('API_PASSWORD_HASHING_'):
+        get_hashing_pool.cache_clear()
+
+
+def run_hashing(func, *args):
+    """Run a hashing function through the pool if there is one"""
+    pool = get_hashing_pool()
+    if pool is None:
+        return func(*args)
+    return pool.submit(func, *args).result()
+
+
+async def arun_hashing(func, *args):
+    """Await a hashing function on the pool, or on a worker thread without one"""
+    pool = get_hashing_pool()
+    if pool is None:
+        return await asyncio.to_thread(func, *args)
+    return await asyncio.wrap_future(pool.submit(func, *args))
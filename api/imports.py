@@ -0,0 +1,93 @@
+from itertools import islice
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .cache import bump_user_version, get_user_timezone
+from .models import DailyRollup, Project, TimeEntry
+from .serializers import TimeEntryImportSerializer
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def import_time_entries(user_id, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create (rows without `id`) or update (rows with the `id` of one of the
+    user's entries) stopped time entries from an iterable of dicts.
+
+    Rows are processed in batches of `batch_size`: each batch is validated
+    against the user's projects loaded once, its existing entries are read
+    with one query, and it is written with bulk_create/bulk_update in its
+    own transaction. Invalid rows are skipped and reported as
+    {'row': <0-based index>, 'errors': {...}}.
+    """
+    projects = list(Project.objects.filter(user_id=user_id).values_list('id', 'name'))
+    validator = TimeEntryImportSerializer(context={
+        'project_ids': dict(projects),
+        'project_names': {name: project_id for project_id, name in projects},
+    })
+    
+    report = {'created': 0, 'updated': 0, 'errors': []}
+    rows = iter(rows)
+    offset = 0
+    while batch := list(islice(rows, batch_size)):
+        created, updated, errors = _import_batch(user_id, batch, offset, validator)
+        report['created'] += created
+        report['updated'] += updated
+        report['errors'].extend(errors)
+        offset += len(batch)
+    return report
+
+
+def _import_batch(user_id, batch, offset, validator):
+    errors = []
+    valid = []
+    for index, row in enumerate(batch, start=offset):
+        try:
+            valid.append((index, validator.run_validation(row)))
+        except serializers.ValidationError as exc:
+            errors.append({'row': index, 'errors': exc.detail})
+    
+    update_ids = [data['id'] for index, data in valid if 'id' in data]
+    existing = TimeEntry.objects.filter(user_id=user_id, id__in=update_ids).in_bulk()
+    
+    now = timezone.now()
+    tzinfo = get_user_timezone(user_id)
+    to_create = []
+    to_update = []
+    rollup_changes = []
+    seen_ids = set()
+    for index, data in valid:
+        entry_id = data.pop('id', None)
+        if entry_id is not None:
+            entry = existing.get(entry_id)
+            if entry is None or entry_id in seen_ids:
+                message = "Time entry not found" if entry is None else "Time entry updated twice in the same batch"
+                errors.append({'row': index, 'errors': {'id': [message]}})
+                continue
+            seen_ids.add(entry_id)
+            previous = entry.get_rollup_contribution(tzinfo)
+            for field, value in data.items():
+                setattr(entry, field, value)
+            entry.updated_at = now
+            to_update.append(entry)
+        else:
+            previous = None
+            entry = TimeEntry(user_id=user_id, **data)
+            to_create.append(entry)
+        # Computed here because bulk writes bypass TimeEntry.save()
+        entry.status = 'stopped'
+        entry.duration_seconds = int((entry.end_time - entry.start_time).total_seconds())
+        rollup_changes.append((previous, entry.get_rollup_contribution(tzinfo)))
+    
+    with transaction.atomic():
+        TimeEntry.objects.bulk_create(to_create, batch_size=IMPORT_BATCH_SIZE)
+        TimeEntry.objects.bulk_update(to_update, [
+            'project', 'description', 'start_time', 'end_time',
+            'duration_seconds', 'status', 'updated_at'
+        ], batch_size=IMPORT_BATCH_SIZE)
+        DailyRollup.objects.apply_changes(rollup_changes)
+        if to_create or to_update:
+            bump_user_version(user_id)
+    
+    errors.sort(key=lambda error: error['row'])
+    return len(to_create), len(to_update), errors
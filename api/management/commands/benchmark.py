@@ -0,0 +1,48 @@
+import json
+import platform
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from api.benchmarks import SCENARIOS, benchmark_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Run benchmark scenarios against a throwaway test database and print the '
+        'results as JSON, to compare between releases.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='+', choices=sorted(SCENARIOS), metavar='SCENARIO',
+                            help=f"One or more of: {', '.join(sorted(SCENARIOS))}.")
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per measurement.')
+        parser.add_argument('--entries', type=int, default=1000, help='Time entries seeded per user.')
+        parser.add_argument('--users', type=int, default=100, help='Users seeded by the load scenario.')
+        parser.add_argument('--scales', type=lambda value: [int(part) for part in value.split(',')],
+                            default=[10_000, 100_000, 1_000_000],
+                            help='Comma-separated entry counts for dashboard-scale.')
+        parser.add_argument('--output', help='Also write the JSON results to this file.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs.')
+
+    def handle(self, *args, **options):
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'options': {key: options[key] for key in ('concurrency', 'requests', 'entries', 'users', 'scales')},
+            'results': {},
+        }
+        for name in options['scenarios']:
+            with benchmark_database(keepdb=options['keepdb']):
+                report['results'][name] = SCENARIOS[name](options)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
@@ -0,0 +1,63 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.exports import read_csv_cell
+from api.imports import IMPORT_BATCH_SIZE, import_time_entries
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Import stopped time entries for a user from a CSV or NDJSON file in the '
+        'format produced by /api/time-entries/export/. Projects are matched by name.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import.')
+        parser.add_argument('--user', required=True, metavar='EMAIL', help='Owner of the imported entries.')
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help='File format, guessed from the file extension by default.'
+        )
+        parser.add_argument(
+            '--keep-ids', action='store_true',
+            help='Use the id and project_id columns to update existing entries of this '
+                 'user instead of creating new entries for every row.'
+        )
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['user']}")
+        
+        file_format = options['format'] or ('ndjson' if options['path'].endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as file:
+                rows = self.read_rows(file, file_format, options['keep_ids'])
+                report = import_time_entries(user.id, rows, batch_size=options['batch_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row'] + 1}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, "
+            f"skipped {len(report['errors'])} invalid row(s)."
+        ))
+    
+    def read_rows(self, file, file_format, keep_ids):
+        if file_format == 'csv':
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for row in rows:
+            if file_format == 'csv':
+                # CSV has no null, the export writes missing values as empty strings,
+                # and quotes text that spreadsheets would run as a formula
+                row = {key: read_csv_cell(value) for key, value in row.items() if value != ''}
+            if not keep_ids:
+                row.pop('id', None)
+                row.pop('project_id', None)
+            yield row
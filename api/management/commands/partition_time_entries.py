@@ -0,0 +1,61 @@
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from api import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage the monthly partitions of the time entries table on PostgreSQL '
+        '(API_PARTITION_TIME_ENTRIES): convert the table, create the partitions of the '
+        'coming months and detach or drop old ones. Safe to run repeatedly, e.g. daily from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Turn the existing table into a partitioned one. Locks the table while '
+                 'its rows are copied, so run it during a maintenance window.'
+        )
+        parser.add_argument(
+            '--ahead', type=int, default=3,
+            help='Months after the current one to create partitions for.'
+        )
+        parser.add_argument(
+            '--detach-before', metavar='YYYY-MM',
+            help='Detach the partitions of months before this one, leaving them as '
+                 'standalone tables to archive (e.g. with pg_dump) and drop.'
+        )
+        parser.add_argument('--drop', action='store_true', help='Drop the detached partitions.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Time entry partitioning requires PostgreSQL.')
+        if not settings.API_PARTITION_TIME_ENTRIES:
+            # The timer queries must know the table is partitioned
+            raise CommandError('Set PARTITION_TIME_ENTRIES=True (API_PARTITION_TIME_ENTRIES) first.')
+        if options['drop'] and not options['detach_before']:
+            raise CommandError('--drop only applies with --detach-before.')
+
+        if options['convert']:
+            try:
+                created = partitioning.convert(connection, options['ahead'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(f'Partitioned the table into {len(created)} monthly partitions.'))
+        else:
+            created = partitioning.create_partitions(connection, options['ahead'])
+            self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partition(s): {', '.join(created) or '-'}"))
+
+        if options['detach_before']:
+            try:
+                year, month = map(int, options['detach_before'].split('-'))
+                before = date(year, month, 1)
+            except ValueError:
+                raise CommandError(f"Invalid --detach-before month: {options['detach_before']}")
+            detached = partitioning.detach_partitions(connection, before, drop=options['drop'])
+            action = 'Dropped' if options['drop'] else 'Detached'
+            self.stdout.write(self.style.SUCCESS(f"{action} {len(detached)} partition(s): {', '.join(detached) or '-'}"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import DailyRollup, User
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user daily rollups used by the dashboard from the raw time entries.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='emails', metavar='EMAIL',
+            help='Only rebuild rollups for this user (can be repeated).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rollup rows inserted per query.'
+        )
+    
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['emails']:
+            users = dict(User.objects.filter(email__in=options['emails']).values_list('email', 'id'))
+            missing = set(options['emails']) - set(users)
+            if missing:
+                raise CommandError(f"Unknown user(s): {', '.join(sorted(missing))}")
+            user_ids = list(users.values())
+        
+        written = DailyRollup.objects.rebuild(user_ids=user_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily rollup rows.'))
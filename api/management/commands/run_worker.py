@@ -0,0 +1,26 @@
+import signal
+from django.core.management.base import BaseCommand
+from api.queue import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background tasks (see api.queue). Start as many workers as needed; '
+        'SIGTERM or SIGINT stops one after its current batch.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed per poll.')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait before polling again when no task is due.'
+        )
+        parser.add_argument('--once', action='store_true', help='Exit when no task is due instead of waiting.')
+    
+    def handle(self, *args, **options):
+        worker = Worker(batch_size=options['batch_size'], poll_interval=options['poll_interval'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(f'Worker {worker.id} started.')
+        worker.run_forever(until_empty=options['once'])
+        self.stdout.write(f'Worker {worker.id} stopped.')
@@ -0,0 +1,238 @@
+"""
+Per-request performance measurements: wall time, database queries and
+time, and response size. PerformanceMiddleware collects them for every
+request, reports them in a Server-Timing header and a JSON log line,
+and adds them to the Prometheus metrics served at /metrics.
+
+Queries are attributed to the request through a context variable, which
+asgiref carries into sync_to_async threads, so queries made by async views
+are counted too. The metrics are kept per process: with several workers,
+each one exposes its own series, which Prometheus sums on scrape.
+"""
+import hmac
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, JsonResponse
+from .querycheck import report_problems
+
+logger = logging.getLogger('api.performance')
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+current_measurement = ContextVar('current_measurement', default=None)
+
+
+class Measurement:
+    """What one request cost"""
+
+    def __init__(self, capture=False):
+        self.started = time.perf_counter()
+        self.duration = None
+        self.queries = 0
+        self.db_time = 0.0
+        # (sql, seconds) of every query, kept for api.querycheck
+        self.statements = [] if capture else None
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            if self.statements is not None:
+                self.statements.append((sql, duration))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection, see track_queries()"""
+    measurement = current_measurement.get()
+    if measurement is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        measurement.record_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def track_queries(sender, connection, **kwargs):
+    # Installed once per connection, like connection.execute_wrapper() but for its lifetime
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Registry:
+    """Prometheus counters and a duration histogram, labelled by view, method and status"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = defaultdict(lambda: {
+            'requests': 0,
+            'buckets': [0] * len(DURATION_BUCKETS),
+            'duration': 0.0,
+            'queries': 0,
+            'db_time': 0.0,
+            'response_bytes': 0,
+        })
+
+    def observe(self, labels, measurement, response_size):
+        bucket = bisect_left(DURATION_BUCKETS, measurement.duration)
+        with self._lock:
+            series = self._series[labels]
+            series['requests'] += 1
+            if bucket < len(DURATION_BUCKETS):
+                series['buckets'][bucket] += 1
+            series['duration'] += measurement.duration
+            series['queries'] += measurement.queries
+            series['db_time'] += measurement.db_time
+            series['response_bytes'] += response_size or 0
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        with self._lock:
+            series = {labels: {**values, 'buckets': list(values['buckets'])} for labels, values in self._series.items()}
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        family('http_request_duration_seconds', 'histogram', 'Time to produce the response, by URL name.')
+        for labels, values in sorted(series.items()):
+            label_text = format_labels(labels)
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, values['buckets']):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{label_text},le="+Inf"}} {values["requests"]}')
+            lines.append(f'http_request_duration_seconds_sum{{{label_text}}} {values["duration"]}')
+            lines.append(f'http_request_duration_seconds_count{{{label_text}}} {values["requests"]}')
+        for name, key, help_text in (
+            ('http_request_db_queries_total', 'queries', 'Database queries run by requests.'),
+            ('http_request_db_seconds_total', 'db_time', 'Time spent in database queries.'),
+            ('http_response_size_bytes_total', 'response_bytes', 'Bytes of response bodies (streamed bodies excluded).'),
+        ):
+            family(name, 'counter', help_text)
+            for labels, values in sorted(series.items()):
+                lines.append(f'{name}{{{format_labels(labels)}}} {values[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def format_labels(labels):
+    view, method, status = labels
+    return f'view="{view}",method="{method}",status="{status}"'
+
+
+registry = Registry()
+
+
+def view_name(request):
+    """The URL name of the view that answered, as in api/urls.py"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or 'unnamed'
+
+
+def response_size(response):
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+def report(request, response, measurement):
+    measurement.finish()
+    size = response_size(response)
+    view = view_name(request)
+    registry.observe((view, request.method, response.status_code), measurement, size)
+
+    if settings.API_SERVER_TIMING:
+        response['Server-Timing'] = ', '.join([
+            f'app;dur={measurement.duration * 1000:.1f}',
+            f'db;dur={measurement.db_time * 1000:.1f};desc="{measurement.queries} queries"',
+        ])
+    # Every request at DEBUG, slow ones at WARNING
+    slow = measurement.duration * 1000 >= settings.API_SLOW_REQUEST_MS
+    logger.log(logging.WARNING if slow else logging.DEBUG, json.dumps({
+        'event': 'request',
+        'view': view,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(measurement.duration * 1000, 2),
+        'db_queries': measurement.queries,
+        'db_ms': round(measurement.db_time * 1000, 2),
+        'response_bytes': size,
+    }))
+    if measurement.statements is not None:
+        report_problems(f'{request.method} {request.path}', measurement.statements)
+
+
+class PerformanceMiddleware:
+    """Measure every request; put it first in MIDDLEWARE to include the others"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        measurement = Measurement(capture=bool(settings.API_QUERY_CHECK))
+        token = current_measurement.set(measurement)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_measurement.reset(token)
+        report(request, response, measurement)
+        return response
+
+    async def __acall__(self, request):
+        measurement = Measurement(capture=bool(settings.API_QUERY_CHECK))
+        token = current_measurement.set(measurement)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_measurement.reset(token)
+        report(request, response, measurement)
+        return response
+
+
+def can_scrape(request):
+    """Staff users, or a scraper presenting API_METRICS_TOKEN as a bearer token"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(settings.API_METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.encode(), settings.API_METRICS_TOKEN.encode()
+    )
+
+
+def metrics(request):
+    """Prometheus scrape endpoint"""
+    if not can_scrape(request):
+        response = JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    TimeEntry = apps.get_model('api', 'TimeEntry')
+    DailyRollup = apps.get_model('api', 'DailyRollup')
+    rows = TimeEntry.objects.filter(status='stopped').annotate(
+        day=TruncDate('start_time')
+    ).order_by().values('user_id', 'project_id', 'day').annotate(
+        total_seconds=Sum('duration_seconds'),
+        entry_count=Count('id')
+    )
+    DailyRollup.objects.bulk_create((DailyRollup(**row) for row in rows), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_project_timeentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_seconds', models.BigIntegerField(default=0)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='api.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('user', 'project', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
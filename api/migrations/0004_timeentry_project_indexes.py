@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', 'is_active'], name='api_project_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeentry',
+            index=models.Index(fields=['user', '-start_time'], name='api_te_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeentry',
+            index=models.Index(condition=models.Q(('end_time__isnull', True), ('status', 'running')), fields=['user'], name='api_te_user_running_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:13
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def stop_duplicate_running_timers(apps, schema_editor):
+    """
+    Keep each user's latest running timer and stop the older ones at the
+    moment the next one was started, so the unique constraint can be added.
+    """
+    TimeEntry = apps.get_model('api', 'TimeEntry')
+    DailyRollup = apps.get_model('api', 'DailyRollup')
+    running = TimeEntry.objects.filter(status='running', end_time__isnull=True)
+    user_ids = list(
+        running.values('user_id').annotate(count=Count('id')).filter(count__gt=1).values_list('user_id', flat=True)
+    )
+    for user_id in user_ids:
+        entries = list(running.filter(user_id=user_id).order_by('-start_time', '-id'))
+        for newer, entry in zip(entries, entries[1:]):
+            entry.end_time = max(newer.start_time, entry.start_time)
+            entry.duration_seconds = int((entry.end_time - entry.start_time).total_seconds())
+            entry.status = 'stopped'
+            entry.save(update_fields=['end_time', 'duration_seconds', 'status', 'updated_at'])
+    
+    # Historical models skip TimeEntry.save(), so recompute the affected rollups
+    DailyRollup.objects.filter(user_id__in=user_ids).delete()
+    rows = TimeEntry.objects.filter(user_id__in=user_ids, status='stopped').annotate(
+        day=TruncDate('start_time')
+    ).order_by().values('user_id', 'project_id', 'day').annotate(
+        total_seconds=Sum('duration_seconds'),
+        entry_count=Count('id')
+    )
+    DailyRollup.objects.bulk_create((DailyRollup(**row) for row in rows), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_timeentry_project_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(stop_duplicate_running_timers, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='timeentry',
+            name='api_te_user_running_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='timeentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_time__isnull', True), ('status', 'running')), fields=('user',), name='api_te_one_running_per_user'),
+        ),
+    ]
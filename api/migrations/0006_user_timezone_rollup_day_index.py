@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:29
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_one_running_timer_per_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=64, validators=[api.models.validate_timezone]),
+        ),
+        migrations.AddIndex(
+            model_name='dailyrollup',
+            index=models.Index(fields=['user', '-day'], name='api_rollup_user_day_idx'),
+        ),
+    ]
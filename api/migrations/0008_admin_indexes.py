@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:03
+
+from django.db import migrations, models
+
+# The admin searches these columns by prefix (search_fields '^'), which
+# PostgreSQL runs as UPPER(column) LIKE UPPER('term%'). A text_pattern_ops
+# index on UPPER(column) answers that whatever the database collation;
+# expression indexes with an operator class are PostgreSQL only, so they are
+# created here rather than in Meta.indexes.
+SEARCH_INDEXES = [
+    ('api_user_email_upper_idx', 'api_user', 'email'),
+    ('api_user_username_upper_idx', 'api_user', 'username'),
+    ('api_project_name_upper_idx', 'api_project', 'name'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} (UPPER({quote(column)}) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_task'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['-created_at', '-id'], name='api_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeentry',
+            index=models.Index(fields=['-start_time', '-id'], name='api_te_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-date_joined', '-id'], name='api_user_joined_idx'),
+        ),
+    ]
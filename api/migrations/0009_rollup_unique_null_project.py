@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:15
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    """
+    Fold the rollup rows of entries without a project that the old unique
+    constraint let through twice for the same day into one row.
+    """
+    DailyRollup = apps.get_model('api', 'DailyRollup')
+    duplicates = DailyRollup.objects.filter(project__isnull=True).order_by().values('user_id', 'day').annotate(
+        rows=Count('id'), keep=Min('id'), total=Sum('total_seconds'), entries=Sum('entry_count')
+    ).filter(rows__gt=1)
+    for row in list(duplicates):
+        DailyRollup.objects.filter(pk=row['keep']).update(total_seconds=row['total'], entry_count=row['entries'])
+        DailyRollup.objects.filter(
+            user_id=row['user_id'], project__isnull=True, day=row['day']
+        ).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='dailyrollup',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(models.F('user'), django.db.models.functions.comparison.Coalesce('project', models.Value(0)), models.F('day'), name='api_rollup_user_project_day_uniq'),
+        ),
+    ]
@@ -1,18 +1,63 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
+from functools import reduce
+from itertools import islice
+import operator
 import uuid
+import zoneinfo
+from .cache import bump_user_version, get_user_timezone, set_user_timezone
+
+def validate_timezone(value):
+    try:
+        zoneinfo.ZoneInfo(value)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"Unknown timezone: {value}")
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     is_email_verified = models.BooleanField(default=False)
     email_verification_token = models.UUIDField(default=uuid.uuid4, editable=False)
+    # IANA name of the timezone the user's days and weeks are counted in
+    timezone = models.CharField(max_length=64, default='UTC', validators=[validate_timezone])
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin changelist order
+            models.Index(fields=['-date_joined', '-id'], name='api_user_joined_idx'),
+        ]
+    
     def __str__(self):
         return self.email
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_timezone = instance.__dict__.get('timezone')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        timezone_changed = (
+            not self._state.adding
+            and getattr(self, '_stored_timezone', None) is not None
+            and self._stored_timezone != self.timezone
+        )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if timezone_changed:
+                # Rollup days were cut in the old timezone
+                set_user_timezone(self.pk, self.timezone)
+                DailyRollup.objects.rebuild(user_ids=[self.pk])
+                bump_user_version(self.pk)
+        self._stored_timezone = self.timezone
 
 class Project(models.Model):
     name = models.CharField(max_length=200)
@@ -26,10 +71,197 @@ class Project(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['name', 'user']
+        indexes = [
+            models.Index(fields=['user', 'is_active'], name='api_project_user_active_idx'),
+            # Admin changelist order
+            models.Index(fields=['-created_at', '-id'], name='api_project_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.user.email})"
 
+class TimeEntryQuerySet(models.QuerySet):
+    # Columns rendered by TimeEntrySerializer
+    LISTING_FIELDS = (
+        'id', 'project', 'project__name', 'project__color', 'description', 'start_time',
+        'end_time', 'duration_seconds', 'status', 'created_at', 'updated_at',
+    )
+    
+    # .values() lookups of the same columns, for serializers.time_entry_rows_data()
+    LISTING_VALUES = (
+        'id', 'project_id', 'project__name', 'project__color', 'description', 'start_time',
+        'end_time', 'duration_seconds', 'status', 'created_at', 'updated_at',
+    )
+    
+    def for_listing(self):
+        """Load only what TimeEntrySerializer renders, with the project joined in"""
+        return self.select_related('project').only(*self.LISTING_FIELDS)
+    
+    def listing_values(self):
+        """The same columns as dicts, skipping model instances (read-only listings)"""
+        return self.values(*self.LISTING_VALUES)
+    
+    def delete(self):
+        """
+        Delete the entries and subtract the stopped ones from the daily
+        rollups, with one write per affected rollup row. Entries deleted along
+        with their user or project skip this: that user's or project's
+        rollups are deleted with them, and the entries go in one statement.
+        """
+        with transaction.atomic(using=self.db):
+            stored = list(self.values(*TimeEntry.ROLLUP_FIELDS))
+            result = super().delete()
+            DailyRollup.objects.apply_changes(
+                (TimeEntry.rollup_contribution(**values), None) for values in stored
+            )
+            for user_id in {values['user_id'] for values in stored}:
+                bump_user_version(user_id)
+        return result
+
+class TimeEntryManager(models.Manager.from_queryset(TimeEntryQuerySet)):
+    """
+    Timer actions written as a single statement each, so that concurrent
+    clients cannot start two timers or stop the same timer twice.
+    """
+    # Must match the condition of the api_te_one_running_per_user constraint
+    # term for term and in the same order (SQLite needs that for ON CONFLICT)
+    RUNNING_CONDITION = "end_time IS NULL AND status = 'running'"
+    # First key of the advisory lock start_timer() takes on a partitioned table
+    RUNNING_TIMER_LOCK = 0x74696d65
+    
+    def _columns(self, connection):
+        return ', '.join(
+            connection.ops.quote_name(field.column) for field in self.model._meta.concrete_fields
+        )
+    
+    def start_timer(self, user_id, project_id=None, description=''):
+        """
+        Insert a running entry for the user, checking in the same statement
+        that the project is theirs. Returns the new entry with its project
+        (only id, name and color loaded), or None if the user already has a
+        running timer. Raises Project.DoesNotExist for another user's project.
+        """
+        connection = connections[self.db]
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            return self._start_timer_fallback(user_id, project_id, description)
+        
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        project_table = quote(Project._meta.db_table)
+        columns = (
+            "(user_id, project_id, description, start_time, end_time, duration_seconds, "
+            "status, created_at, updated_at)"
+        )
+        params = [user_id, project_id, description, now, now, now]
+        conditions = []
+        if project_id is not None:
+            conditions.append(f"EXISTS (SELECT 1 FROM {project_table} WHERE id = %s AND user_id = %s)")
+            params += [project_id, user_id]
+        # The project's name and color for the response, in the same round trip
+        returning = (
+            f"RETURNING {self._columns(connection)}, "
+            f"(SELECT name FROM {project_table} WHERE id = project_id) AS project_name, "
+            f"(SELECT color FROM {project_table} WHERE id = project_id) AS project_color"
+        )
+        if connection.vendor == 'postgresql' and settings.API_PARTITION_TIME_ENTRIES:
+            # A partitioned table cannot have the unique index (see api.partitioning):
+            # check for a running timer while holding a per-user lock instead
+            conditions.append(f"NOT EXISTS (SELECT 1 FROM {table} WHERE user_id = %s AND {self.RUNNING_CONDITION})")
+            params.append(user_id)
+            sql = (
+                f"INSERT INTO {table} {columns} "
+                f"SELECT %s, %s, %s, %s, NULL, 0, 'running', %s, %s WHERE {' AND '.join(conditions)} "
+                f"{returning}"
+            )
+            with transaction.atomic(using=self.db):
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [self.RUNNING_TIMER_LOCK, user_id])
+                time_entry = next(iter(self.raw(sql, params)), None)
+        else:
+            # SQLite needs a WHERE clause to parse ON CONFLICT after INSERT ... SELECT
+            sql = (
+                f"INSERT INTO {table} {columns} "
+                f"SELECT %s, %s, %s, %s, NULL, 0, 'running', %s, %s WHERE {' AND '.join(conditions) or 'TRUE'} "
+                f"ON CONFLICT (user_id) WHERE {self.RUNNING_CONDITION} DO NOTHING "
+                f"{returning}"
+            )
+            time_entry = next(iter(self.raw(sql, params)), None)
+        if time_entry is None:
+            if project_id is not None and not Project.objects.filter(id=project_id, user_id=user_id).exists():
+                raise Project.DoesNotExist('Project not found')
+            return None
+        if project_id is not None:
+            time_entry.project = Project(
+                id=project_id, user_id=user_id, name=time_entry.project_name, color=time_entry.project_color
+            )
+        bump_user_version(user_id)
+        return time_entry
+    
+    def stop_timer(self, user_id, time_entry_id):
+        """
+        Stop the user's running entry and compute its duration in the
+        database. Returns the stopped entry, or None if no such running entry.
+        """
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql':
+            duration = "GREATEST(0, FLOOR(EXTRACT(EPOCH FROM (%s - start_time))))::integer"
+        elif connection.vendor == 'sqlite':
+            duration = (
+                "MAX(0, CAST(ROUND((julianday(%s) - julianday(start_time)) * 86400000) AS INTEGER) / 1000)"
+            )
+        else:
+            return self._stop_timer_fallback(user_id, time_entry_id)
+        
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = (
+            f"UPDATE {table} "
+            f"SET end_time = %s, updated_at = %s, status = 'stopped', duration_seconds = {duration} "
+            f"WHERE id = %s AND user_id = %s AND {self.RUNNING_CONDITION} "
+            # The start of the user's only running entry, from the running index, lets
+            # a partitioned table (see api.partitioning) update a single partition
+            f"AND start_time = (SELECT start_time FROM {table} WHERE user_id = %s AND {self.RUNNING_CONDITION}) "
+            f"RETURNING {self._columns(connection)}"
+        )
+        with transaction.atomic(using=self.db):
+            time_entry = next(iter(self.raw(sql, [now, now, now, time_entry_id, user_id, user_id])), None)
+            if time_entry is not None:
+                DailyRollup.objects.apply_change(None, time_entry.get_rollup_contribution())
+                bump_user_version(user_id)
+        return time_entry
+    
+    # Raw queries have no async API: the async variants run the statements in a thread
+    async def astart_timer(self, user_id, project_id=None, description=''):
+        return await sync_to_async(self.start_timer)(user_id, project_id, description)
+    
+    async def astop_timer(self, user_id, time_entry_id):
+        return await sync_to_async(self.stop_timer)(user_id, time_entry_id)
+    
+    def _start_timer_fallback(self, user_id, project_id, description):
+        # Databases without partial unique indexes cannot enforce a single running timer
+        with transaction.atomic(using=self.db):
+            project = None
+            if project_id is not None:
+                project = Project.objects.get(id=project_id, user_id=user_id)
+            if self.filter(user_id=user_id, status='running', end_time__isnull=True).exists():
+                return None
+            return self.create(
+                user_id=user_id, project=project, description=description,
+                start_time=timezone.now(), status='running'
+            )
+    
+    def _stop_timer_fallback(self, user_id, time_entry_id):
+        with transaction.atomic(using=self.db):
+            time_entry = self.select_for_update().filter(
+                id=time_entry_id, user_id=user_id, status='running', end_time__isnull=True
+            ).first()
+            if time_entry is not None:
+                time_entry.end_time = timezone.now()
+                time_entry.status = 'stopped'
+                time_entry.save()
+        return time_entry
+
 class TimeEntry(models.Model):
     STATUS_CHOICES = [
         ('running', 'Running'),
@@ -47,19 +279,90 @@ class TimeEntry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TimeEntryManager()
+    
     class Meta:
         ordering = ['-start_time']
+        indexes = [
+            # Per-user listings and start_time ranges (time entries, dashboard)
+            models.Index(fields=['user', '-start_time'], name='api_te_user_start_idx'),
+            # Admin changelist order, across users
+            models.Index(fields=['-start_time', '-id'], name='api_te_start_idx'),
+        ]
+        constraints = [
+            # At most one running timer per user; also serves running timer lookups
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=Q(status='running', end_time__isnull=True),
+                name='api_te_one_running_per_user'
+            ),
+        ]
     
     def __str__(self):
         project_name = self.project.name if self.project else "No Project"
         return f"{project_name} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
     
+    # Fields that decide how an entry contributes to its DailyRollup row
+    ROLLUP_FIELDS = ('user_id', 'project_id', 'start_time', 'duration_seconds', 'status')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the stored row contributes so save() can apply a delta
+        if all(name in instance.__dict__ for name in cls.ROLLUP_FIELDS):
+            instance._stored_rollup_values = instance._rollup_values()
+        return instance
+    
     def save(self, *args, **kwargs):
         # Calculate duration if both start and end times are set
         if self.start_time and self.end_time:
             delta = self.end_time - self.start_time
             self.duration_seconds = int(delta.total_seconds())
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = self._stored_rollup_contribution()
+            super().save(*args, **kwargs)
+            DailyRollup.objects.apply_change(previous, self.get_rollup_contribution())
+            self._stored_rollup_values = self._rollup_values()
+    
+    def delete(self, *args, **kwargs):
+        # Done here rather than in a post_delete receiver, which would stop
+        # Django from deleting a user's or project's entries in one statement
+        with transaction.atomic():
+            previous = self._stored_rollup_contribution()
+            result = super().delete(*args, **kwargs)
+            DailyRollup.objects.apply_change(previous, None)
+            bump_user_version(self.user_id)
+        return result
+    
+    def _rollup_values(self):
+        return {name: getattr(self, name) for name in self.ROLLUP_FIELDS}
+    
+    def _stored_rollup_contribution(self):
+        """Return the rollup contribution of the row as it is currently stored"""
+        if self._state.adding:
+            return None
+        values = getattr(self, '_stored_rollup_values', None)
+        if values is None:
+            # Instance was loaded with deferred fields, read them back from the database
+            values = TimeEntry.objects.filter(pk=self.pk).values(*self.ROLLUP_FIELDS).first()
+            if values is None:
+                return None
+        return self.rollup_contribution(**values)
+    
+    def get_rollup_contribution(self, tzinfo=None):
+        """
+        Return the (user_id, project_id, day, seconds) this entry adds to the
+        daily rollups, or None if it is not counted (only stopped entries are).
+        """
+        return self.rollup_contribution(**self._rollup_values(), tzinfo=tzinfo)
+    
+    @staticmethod
+    def rollup_contribution(user_id, project_id, start_time, duration_seconds, status, tzinfo=None):
+        if status != 'stopped' or not start_time:
+            return None
+        # Days are counted in the user's own timezone
+        day = timezone.localdate(start_time, tzinfo or get_user_timezone(user_id))
+        return (user_id, project_id, day, duration_seconds)
     
     @property
     def duration_formatted(self):
@@ -73,3 +376,170 @@ class TimeEntry(models.Model):
     def is_running(self):
         """Check if this time entry is currently running"""
         return self.status == 'running' and self.end_time is None
+
+
+class DailyRollupManager(models.Manager):
+    def apply(self, user_id, project_id, day, seconds, count):
+        """
+        Add seconds/count to a rollup row, creating the row if needed and
+        deleting it once it counts no entries
+        """
+        if not seconds and not count:
+            return
+        rows = self.filter(user_id=user_id, project_id=project_id, day=day)
+        changes = {
+            'total_seconds': F('total_seconds') + seconds,
+            'entry_count': F('entry_count') + count,
+        }
+        if rows.update(**changes):
+            if count < 0:
+                rows.filter(entry_count__lte=0).delete()
+            return
+        if count < 0:
+            # Nothing to subtract from when the row does not exist
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    user_id=user_id, project_id=project_id, day=day,
+                    total_seconds=seconds, entry_count=count
+                )
+        except IntegrityError:
+            # Created concurrently by another request
+            rows.update(**changes)
+    
+    def apply_change(self, previous, current):
+        """Move a time entry's contribution from `previous` to `current`"""
+        if previous == current:
+            return
+        if previous and current and previous[:3] == current[:3]:
+            self.apply(*current[:3], current[3] - previous[3], 0)
+            return
+        if previous:
+            self.apply(*previous[:3], -previous[3], -1)
+        if current:
+            self.apply(*current[:3], current[3], 1)
+    
+    def apply_changes(self, changes):
+        """
+        Apply many (previous, current) contribution changes at once, with
+        one write per affected rollup row (used by bulk writes). Rows left
+        counting no entries are deleted, as in apply().
+        """
+        deltas = {}
+        for previous, current in changes:
+            for contribution, sign in ((previous, -1), (current, 1)):
+                if contribution:
+                    seconds, count = deltas.get(contribution[:3], (0, 0))
+                    deltas[contribution[:3]] = (seconds + sign * contribution[3], count + sign)
+        if not deltas:
+            return
+        
+        # Create the missing rows in one statement, then update each row in place
+        existing = set(self.filter(
+            user_id__in={key[0] for key in deltas},
+            day__in={key[2] for key in deltas}
+        ).values_list('user_id', 'project_id', 'day'))
+        self.bulk_create([
+            self.model(user_id=user_id, project_id=project_id, day=day)
+            for (user_id, project_id, day), (seconds, count) in deltas.items()
+            if (user_id, project_id, day) not in existing and count > 0
+        ], ignore_conflicts=True)
+        for (user_id, project_id, day), (seconds, count) in deltas.items():
+            if seconds or count:
+                self.filter(user_id=user_id, project_id=project_id, day=day).update(
+                    total_seconds=F('total_seconds') + seconds,
+                    entry_count=F('entry_count') + count
+                )
+        emptied = [Q(user_id=user_id, project_id=project_id, day=day)
+                   for (user_id, project_id, day), (seconds, count) in deltas.items() if count < 0]
+        if emptied:
+            self.filter(reduce(operator.or_, emptied), entry_count__lte=0).delete()
+    
+    def rebuild(self, user_ids=None, batch_size=1000):
+        """
+        Recompute rollups from the raw time entries, for all users or only
+        for `user_ids`. Returns the number of rollup rows written.
+        """
+        entries = TimeEntry.objects.filter(status='stopped')
+        rollups = self.all()
+        users = User.objects.all()
+        if user_ids is not None:
+            entries = entries.filter(user_id__in=user_ids)
+            rollups = rollups.filter(user_id__in=user_ids)
+            users = users.filter(id__in=user_ids)
+        
+        written = 0
+        with transaction.atomic():
+            rollups.delete()
+            # Days are cut in each user's timezone: one aggregate per timezone in use
+            for timezone_name in users.values_list('timezone', flat=True).distinct().order_by():
+                rows = entries.filter(user__timezone=timezone_name).annotate(
+                    day=TruncDate('start_time', tzinfo=zoneinfo.ZoneInfo(timezone_name))
+                ).order_by().values('user_id', 'project_id', 'day').annotate(
+                    total_seconds=Sum('duration_seconds'),
+                    entry_count=Count('id')
+                ).iterator(chunk_size=batch_size)
+                while batch := [self.model(**row) for row in islice(rows, batch_size)]:
+                    self.bulk_create(batch)
+                    written += len(batch)
+        return written
+
+class DailyRollup(models.Model):
+    """Total tracked time of stopped entries per user, project and day"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='daily_rollups', null=True, blank=True)
+    day = models.DateField()
+    total_seconds = models.BigIntegerField(default=0)
+    entry_count = models.IntegerField(default=0)
+    
+    objects = DailyRollupManager()
+    
+    class Meta:
+        ordering = ['-day']
+        indexes = [
+            # Dashboard and report date ranges, across projects
+            models.Index(fields=['user', '-day'], name='api_rollup_user_day_idx'),
+        ]
+        constraints = [
+            # One row per user, project and day. NULLs are distinct in a plain
+            # unique index, so entries without a project would be allowed two
+            # rows for a day; the key counts them as project 0 instead.
+            models.UniqueConstraint(
+                'user', Coalesce('project', Value(0)), 'day', name='api_rollup_user_project_day_uniq'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.day}: {self.total_seconds}s"
+
+class Task(models.Model):
+    """A call of a background task (see api.queue), run by `manage.py run_worker`"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Not run before this time; pushed back after each failed attempt
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # The worker's poll for due tasks, and its check for stale running ones
+            models.Index(fields=['status', 'run_at'], name='api_task_status_run_at_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,250 @@
+"""
+Monthly range partitioning of the time entries table on start_time, for
+PostgreSQL with API_PARTITION_TIME_ENTRIES set.
+
+`manage.py partition_time_entries --convert` turns the table into a
+partitioned one, with a partition per month (api_timeentry_y2026m01, ...)
+and a default partition for rows outside them. Queries bounded by
+start_time, as the dashboard, reports and listings are, then only read the
+partitions of their range. The same command creates future partitions
+ahead of time and detaches (or drops) old ones; run it from cron.
+
+PostgreSQL requires unique constraints of a partitioned table to include
+the partition key. The primary key becomes (id, start_time), with ids still
+unique from their identity sequence, and the single running timer per user
+is kept by TimeEntryManager.start_timer() under an advisory lock instead of
+the api_te_one_running_per_user unique index, recreated as a plain index.
+
+The migration state keeps describing the unpartitioned table: `id` as the
+primary key and the unique running timer constraint. Django only uses that
+state to generate DDL, so the ORM is unaffected, but migrations altering the
+partition key or adding unique constraints to the table would fail on it.
+check_migration_plan() refuses to apply them to a partitioned table unless
+they are marked `partition_safe = True`, i.e. their database operations
+(e.g. in SeparateDatabaseAndState) were written for the partitioned table.
+"""
+from datetime import date
+from django.core.management.base import CommandError
+from django.db import connections, migrations, models, transaction
+from .models import TimeEntry
+
+# Columns of the partitioned table's primary key
+KEY_FIELDS = ('id', 'start_time')
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_of(value):
+    return date(value.year, value.month, 1)
+
+
+def table_name():
+    return TimeEntry._meta.db_table
+
+
+def partition_name(month):
+    return f'{table_name()}_y{month.year}m{month.month:02d}'
+
+
+def default_partition_name():
+    return f'{table_name()}_default'
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table_name()])
+        return cursor.fetchone() is not None
+
+
+def conflicting_operations(migration):
+    """The database operations of `migration` that a partitioned time entries table cannot take"""
+    model_name = TimeEntry._meta.model_name
+
+    def conflicts(operation):
+        if isinstance(operation, migrations.SeparateDatabaseAndState):
+            return any(conflicts(database_operation) for database_operation in operation.database_operations)
+        if isinstance(operation, migrations.RenameModel):
+            # The partitions are found by the table name
+            return model_name in (operation.old_name_lower, operation.new_name_lower)
+        if isinstance(operation, migrations.AlterModelTable):
+            return operation.name_lower == model_name
+        if isinstance(operation, migrations.AlterUniqueTogether):
+            return operation.name_lower == model_name and any(
+                'start_time' not in fields for fields in operation.option_value or ()
+            )
+        if getattr(operation, 'model_name_lower', None) != model_name:
+            return False
+        if isinstance(operation, (migrations.AddField, migrations.AlterField)):
+            return operation.name in KEY_FIELDS or operation.field.primary_key or operation.field.unique
+        if isinstance(operation, migrations.RemoveField):
+            return operation.name in KEY_FIELDS
+        if isinstance(operation, migrations.RenameField):
+            return operation.old_name in KEY_FIELDS
+        if isinstance(operation, migrations.AddConstraint):
+            constraint = operation.constraint
+            return isinstance(constraint, models.UniqueConstraint) and 'start_time' not in constraint.fields
+        return False
+
+    return [operation for operation in migration.operations if conflicts(operation)]
+
+
+def check_migration_plan(plan, using, **kwargs):
+    """pre_migrate receiver refusing migrations the partitioned table cannot take"""
+    if not plan or not is_partitioned(connections[using]):
+        return
+    for migration, backwards in plan:
+        if getattr(migration, 'partition_safe', False):
+            continue
+        operations = conflicting_operations(migration)
+        if operations:
+            raise CommandError(
+                f"Migration {migration.app_label}.{migration.name} would run "
+                f"{', '.join(operation.describe() for operation in operations)} on the partitioned "
+                f"{table_name()} table (see api.partitioning). Write its database operations for the "
+                f"partitioned table and set partition_safe = True on the migration."
+            )
+
+
+def partition_bounds(connection):
+    """{partition name: first month} of the attached monthly partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [table_name()]
+        )
+        names = [name for name, in cursor.fetchall()]
+    prefix = f'{table_name()}_y'
+    months = {}
+    for name in names:
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('m')
+            months[name] = date(int(year), int(month), 1)
+    return months
+
+
+def create_partition(connection, month):
+    """
+    Create and attach the partition of `month` unless it exists, moving in
+    the rows of that month that landed in the default partition. Returns
+    whether it was created.
+    """
+    name = partition_name(month)
+    if name in partition_bounds(connection):
+        return False
+    quote = connection.ops.quote_name
+    table, default = quote(table_name()), quote(default_partition_name())
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {quote(name)} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE start_time >= %s AND start_time < %s RETURNING *) '
+            f'INSERT INTO {quote(name)} SELECT * FROM moved',
+            bounds
+        )
+        # Attaching checks the default partition has no rows left in the range
+        cursor.execute(
+            f'ALTER TABLE {table} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)',
+            bounds
+        )
+    return True
+
+
+def create_partitions(connection, ahead, today=None):
+    """Make sure the partitions of this month and the `ahead` next ones exist; returns those created"""
+    this_month = month_of(today or date.today())
+    months = [add_months(this_month, offset) for offset in range(ahead + 1)]
+    return [partition_name(month) for month in months if create_partition(connection, month)]
+
+
+def detach_partitions(connection, before, drop=False):
+    """
+    Detach the partitions of months before `before`, leaving them as plain
+    tables to archive (or dropping them). Their entries disappear from the
+    API; the daily rollups keep counting them until rebuilt.
+    """
+    quote = connection.ops.quote_name
+    detached = []
+    for name, month in sorted(partition_bounds(connection).items(), key=lambda item: item[1]):
+        if month >= month_of(before):
+            continue
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {quote(table_name())} DETACH PARTITION {quote(name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {quote(name)}')
+        detached.append(name)
+    return detached
+
+
+def convert(connection, ahead):
+    """
+    Replace the time entries table by a partitioned one with the same
+    columns, indexes and foreign keys, and copy the rows over, in one
+    transaction that locks the table. Returns the partitions created.
+    """
+    quote = connection.ops.quote_name
+    table = table_name()
+    old = f'{table}_unpartitioned'
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if is_partitioned(connection):
+            raise ValueError(f'{table} is already partitioned.')
+
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "  SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'"
+            ")",
+            [table, table]
+        )
+        # Read before the rename, so the definitions name the new table
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT MIN(start_time), MAX(start_time) FROM " + quote(table))
+        first, last = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+            f'INCLUDING IDENTITY) PARTITION BY RANGE (start_time)'
+        )
+        cursor.execute(f'CREATE TABLE {quote(default_partition_name())} PARTITION OF {quote(table)} DEFAULT')
+        this_month = month_of(date.today())
+        month = month_of(first) if first else this_month
+        end = max(month_of(last) if last else this_month, add_months(this_month, ahead))
+        created = []
+        while month <= end:
+            name = partition_name(month)
+            cursor.execute(
+                f'CREATE TABLE {quote(name)} PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)',
+                [month.isoformat(), add_months(month, 1).isoformat()]
+            )
+            created.append(name)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {quote(table)} OVERRIDING SYSTEM VALUE SELECT * FROM {quote(old)}')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {quote(table)}), 0) + 1, false)",
+            [table]
+        )
+        cursor.execute(f'DROP TABLE {quote(old)}')
+
+        # Indexes on the parent are created on every partition, present and future
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, start_time)')
+        for name, definition in indexes:
+            # A unique index without start_time is not allowed, keep it as a plain index
+            cursor.execute(definition.replace('CREATE UNIQUE INDEX', 'CREATE INDEX', 1))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+    return created
+
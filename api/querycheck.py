@@ -0,0 +1,88 @@
+"""
+Development and test guard against query regressions. With API_QUERY_CHECK
+set, the SQL of every request (see api.metrics) is fingerprinted and two
+patterns are reported:
+
+- the same statement shape run API_QUERY_REPEAT_THRESHOLD times or more,
+  usually an N+1 lookup of a related object in a loop, and
+- single queries slower than API_SLOW_QUERY_MS.
+
+'warn' logs them on the api.queries logger, 'raise' raises
+QueryCheckError, which makes the request fail in tests.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+
+logger = logging.getLogger('api.queries')
+
+# Statements that come with transactions and savepoints, not from a lookup
+IGNORED_STATEMENTS = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT)\b', re.I)
+
+FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                  # string literals
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),                # numbers
+    (re.compile(r'%s|\?'), '?'),                            # placeholders
+    (re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I), 'IN (...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+class QueryCheckError(AssertionError):
+    """A request ran repeated or slow queries"""
+
+
+def fingerprint(sql):
+    """The statement with its literals and parameters blanked out"""
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def find_problems(statements):
+    """
+    Return a description of each problem in `statements`, a list of
+    (sql, seconds) pairs.
+    """
+    statements = [(sql, duration) for sql, duration in statements if not IGNORED_STATEMENTS.match(sql)]
+    problems = []
+    counts = Counter(fingerprint(sql) for sql, duration in statements)
+    for shape, count in counts.items():
+        if count >= settings.API_QUERY_REPEAT_THRESHOLD:
+            problems.append(f'{count} repeated queries (possible N+1): {shape}')
+    for sql, duration in statements:
+        if duration * 1000 >= settings.API_SLOW_QUERY_MS:
+            problems.append(f'slow query ({duration * 1000:.1f} ms): {sql}')
+    return problems
+
+
+def report_problems(label, statements, raise_errors=None):
+    """Log the problems of `statements`, or raise (by default if API_QUERY_CHECK is 'raise')"""
+    problems = find_problems(statements)
+    if not problems:
+        return
+    message = f'{label}:\n' + '\n'.join(f'  {problem}' for problem in problems)
+    if raise_errors is None:
+        raise_errors = settings.API_QUERY_CHECK == 'raise'
+    if raise_errors:
+        raise QueryCheckError(message)
+    logger.warning(message)
+
+
+@contextmanager
+def check_queries(label='block', raise_errors=None):
+    """
+    Check the queries run inside the block like those of a request, e.g. in
+    management commands or tests of model code.
+    """
+    from .metrics import Measurement, current_measurement
+
+    measurement = Measurement(capture=True)
+    token = current_measurement.set(measurement)
+    try:
+        yield measurement
+    finally:
+        current_measurement.reset(token)
+    report_problems(label, measurement.statements, raise_errors)
@@ -0,0 +1,167 @@
+"""
+A small task queue kept in the database, for side effects that should not
+hold up a request, such as sending email.
+
+Functions decorated with @task are registered under their dotted path, and
+`func.delay(**kwargs)` stores a Task row in the current transaction, so a
+task only exists if the changes of the request that queued it commit.
+`manage.py run_worker` processes run them. Each poll claims a batch of due
+tasks in one transaction, with SKIP LOCKED where the database supports it so
+that several workers share the queue, then runs them one by one. A task
+that raises is retried after an exponential backoff until its max_attempts,
+then left 'failed' with the traceback in last_error. Tasks still 'running'
+after API_TASK_TIMEOUT seconds belong to a dead worker and are retried.
+
+Keyword arguments are stored as JSON: pass ids, not model instances. A task
+may run twice (a worker can die between running it and recording it), so
+tasks must be idempotent.
+
+With API_TASKS_EAGER, delay() runs the task in the calling process once the
+transaction commits instead, for development without a worker.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Task
+
+logger = logging.getLogger('api.tasks')
+
+TASKS = {}
+
+
+def task(func=None, *, max_attempts=5):
+    """Register a function as a task; call `func.delay(**kwargs)` to queue it"""
+    def register(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        TASKS[name] = func
+
+        def delay(**kwargs):
+            return enqueue(name, kwargs, max_attempts=max_attempts)
+
+        func.task_name = name
+        func.delay = delay
+        return func
+    return register(func) if func is not None else register
+
+
+def enqueue(name, kwargs, max_attempts=5, run_at=None):
+    """Queue a call of the task `name`; returns the Task (None when eager)"""
+    if name not in TASKS:
+        raise LookupError(f'Unknown task: {name}')
+    if settings.API_TASKS_EAGER:
+        # Errors are logged rather than failing the request that committed
+        transaction.on_commit(lambda: TASKS[name](**kwargs), robust=True)
+        return None
+    return Task.objects.create(
+        name=name, kwargs=kwargs, max_attempts=max_attempts, run_at=run_at or timezone.now()
+    )
+
+
+def retry_delay(attempts):
+    """Seconds before retrying after `attempts` failures: doubling, capped, with jitter"""
+    delay = min(settings.API_TASK_RETRY_MAX_DELAY, settings.API_TASK_RETRY_DELAY * 2 ** (attempts - 1))
+    # Spread the retries of tasks that failed together, e.g. during an SMTP outage
+    return delay * random.uniform(0.5, 1)
+
+
+class Worker:
+    """Claims due tasks in batches and runs them; see `manage.py run_worker`"""
+
+    def __init__(self, batch_size=10, poll_interval=1.0):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.stopping = False
+        self.pruned_at = None
+
+    def claim(self):
+        """Mark up to batch_size due tasks as running by this worker and return them"""
+        now = timezone.now()
+        with transaction.atomic():
+            due = Task.objects.filter(status='pending', run_at__lte=now).order_by('run_at')
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            ids = list(due.values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                return []
+            # Conditional on the status, so that without row locks (SQLite)
+            # a task claimed by another worker meanwhile is left alone
+            Task.objects.filter(id__in=ids, status='pending').update(
+                status='running', locked_at=now, locked_by=self.id, attempts=F('attempts') + 1
+            )
+        return list(Task.objects.filter(id__in=ids, status='running', locked_by=self.id).order_by('run_at'))
+
+    def run(self, task_row):
+        func = TASKS.get(task_row.name)
+        try:
+            if func is None:
+                raise LookupError(f'Unknown task: {task_row.name}')
+            func(**task_row.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            if func is None or task_row.attempts >= task_row.max_attempts:
+                changes = {'status': 'failed', 'finished_at': timezone.now()}
+                logger.error('Task %s %s failed for good:\n%s', task_row.pk, task_row.name, error)
+            else:
+                changes = {'status': 'pending', 'run_at': timezone.now() + timedelta(seconds=retry_delay(task_row.attempts))}
+                logger.warning('Task %s %s failed, will retry:\n%s', task_row.pk, task_row.name, error)
+            changes['last_error'] = error
+        else:
+            changes = {'status': 'done', 'finished_at': timezone.now()}
+        # Unless it was taken back as stale meanwhile
+        Task.objects.filter(pk=task_row.pk, status='running', locked_by=self.id).update(
+            locked_at=None, locked_by='', **changes
+        )
+
+    def requeue_stale(self):
+        """Retry (or fail) tasks left running by workers that died"""
+        stale = Task.objects.filter(
+            status='running', locked_at__lt=timezone.now() - timedelta(seconds=settings.API_TASK_TIMEOUT)
+        )
+        changes = {'locked_at': None, 'locked_by': '', 'last_error': 'Worker timed out'}
+        stale.filter(attempts__gte=F('max_attempts')).update(status='failed', finished_at=timezone.now(), **changes)
+        stale.update(status='pending', run_at=timezone.now(), **changes)
+
+    def prune(self):
+        """Delete finished tasks after API_TASK_KEEP_DAYS, at most hourly"""
+        now = timezone.now()
+        if self.pruned_at and now - self.pruned_at < timedelta(hours=1):
+            return
+        self.pruned_at = now
+        Task.objects.filter(
+            status__in=['done', 'failed'], finished_at__lt=now - timedelta(days=settings.API_TASK_KEEP_DAYS)
+        ).delete()
+
+    def run_batch(self):
+        """Run one batch of due tasks; returns how many were run"""
+        self.requeue_stale()
+        self.prune()
+        tasks = self.claim()
+        for task_row in tasks:
+            self.run(task_row)
+        return len(tasks)
+
+    def run_forever(self, until_empty=False):
+        """Poll for tasks until stop() is called (or, with until_empty, none are due)"""
+        while not self.stopping:
+            # Like around each request: drop connections that broke or are too old
+            close_old_connections()
+            if self.run_batch():
+                continue
+            if until_empty:
+                break
+            time.sleep(self.poll_interval)
+        close_old_connections()
+
+    def stop(self, *args):
+        """Return from run_forever() once the current batch is done"""
+        self.stopping = True
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+from rest_framework.utils import encoders
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Marks CSV as an acceptable format for content negotiation. Exports are
+    streamed by the view itself, so this only renders small payloads such
+    as validation errors, one "field,message" row each.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['field', 'message'])
+        errors = data.items() if isinstance(data, dict) else [('', data)]
+        for field, messages in errors:
+            for message in messages if isinstance(messages, list) else [messages]:
+                writer.writerow([field, message])
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline delimited JSON. Like CSVRenderer, it renders small payloads
+    (errors) as a single JSON line while exports are streamed by the view.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer's exact output, encoded with orjson when it is installed.
+    Types orjson does not know (and datetimes, which it would format its own
+    way) go through the DRF encoder like before. Pretty-printed requests,
+    non-default UNICODE_JSON/COMPACT_JSON settings and payloads orjson
+    rejects (non-string keys, huge integers) fall back to JSONRenderer.
+    Floats may differ in exponent notation (1e-5 against 1e-05), so use it
+    for payloads without them.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encoders.JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does, to stay a strict javascript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
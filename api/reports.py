@@ -0,0 +1,94 @@
+"""
+Time totals grouped by project and by day, week or month, for charts. They
+are aggregated from the daily rollups, whose days are already cut in the
+user's timezone, so a report over any range is a single grouped query.
+Only stopped entries are counted.
+"""
+from datetime import timedelta
+from django.db.models import Sum
+from django.db.models.functions import Trunc
+from .models import DailyRollup
+
+BUCKET_SIZES = ('day', 'week', 'month')
+
+# Largest number of buckets a report may span
+MAX_REPORT_BUCKETS = 1000
+
+
+def bucket_start(day, size):
+    """The first day of the bucket containing `day` (weeks start on Monday)"""
+    if size == 'week':
+        return day - timedelta(days=day.weekday())
+    if size == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(start, end, size):
+    """The first days of the buckets covering [start, end)"""
+    day = bucket_start(start, size)
+    while day < end:
+        yield day
+        if size == 'month':
+            day = (day + timedelta(days=32)).replace(day=1)
+        else:
+            day += timedelta(days=7 if size == 'week' else 1)
+
+
+def bucket_count(start, end, size):
+    if size == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - bucket_start(start, size)).days // (7 if size == 'week' else 1) + 1
+
+
+def build_report(user_id, start, end, group_by='day', project_id=None, breakdown=False):
+    """
+    Totals of the user's time between the `start` (inclusive) and `end`
+    (exclusive) days: overall, per project and per bucket, optionally with
+    the per-project breakdown of each bucket. Buckets without any time are
+    included, so the series has no gaps.
+    """
+    rollups = DailyRollup.objects.filter(user_id=user_id, day__gte=start, day__lt=end)
+    if project_id is not None:
+        rollups = rollups.filter(project_id=project_id)
+    rows = rollups.annotate(bucket=Trunc('day', group_by)).values(
+        'bucket', 'project_id', 'project__name'
+    ).annotate(
+        total_seconds=Sum('total_seconds'),
+        entry_count=Sum('entry_count')
+    ).order_by('bucket', 'project_id')
+
+    buckets = {
+        day: {'start': day, 'total_seconds': 0, 'entry_count': 0}
+        for day in bucket_starts(start, end, group_by)
+    }
+    if breakdown:
+        for bucket in buckets.values():
+            bucket['projects'] = []
+    projects = {}
+    for row in rows:
+        project = {
+            'project_id': row['project_id'],
+            'project_name': row['project__name'],
+            'total_seconds': row['total_seconds'],
+            'entry_count': row['entry_count'],
+        }
+        bucket = buckets[row['bucket']]
+        bucket['total_seconds'] += project['total_seconds']
+        bucket['entry_count'] += project['entry_count']
+        if breakdown:
+            bucket['projects'].append(project)
+
+        totals = projects.setdefault(row['project_id'], {**project, 'total_seconds': 0, 'entry_count': 0})
+        totals['total_seconds'] += project['total_seconds']
+        totals['entry_count'] += project['entry_count']
+
+    return {
+        'from': start,
+        'to': end,
+        'group_by': group_by,
+        'total_seconds': sum(bucket['total_seconds'] for bucket in buckets.values()),
+        'entry_count': sum(bucket['entry_count'] for bucket in buckets.values()),
+        'projects': sorted(projects.values(), key=lambda project: -project['total_seconds']),
+        'buckets': list(buckets.values()),
+    }
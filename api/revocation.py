@@ -0,0 +1,157 @@
+"""
+Front cache of revoked (blacklisted) refresh tokens, so checking a token
+on refresh does not query the database in the common case.
+
+The blacklist tables of rest_framework_simplejwt stay the source of truth.
+A revocation is also written to the shared cache when its transaction
+commits, under a key that expires with the token. Each process keeps:
+
+- an LRU of token ids it already knows to be revoked, and
+- a Bloom filter of the ids revoked before it was built, loaded from the
+  database once. It is tagged with the shared cache's epoch, a value that
+  disappears when the cache is flushed, so a flush triggers a rebuild.
+
+A token is revoked if it is in the LRU or the shared cache. Otherwise it is
+not revoked if the Bloom filter has never seen it, and only the rare false
+positive falls back to a database lookup. This assumes the cache does not
+evict revocation keys before they expire (Redis `noeviction` or a
+`volatile-*` policy with the epoch kept, or a dedicated instance).
+
+It also assumes every process shares the cache: with a per-process cache,
+like the default local memory one, a revocation made by another process
+after the Bloom filter was built would be missed. So it is only used with
+API_REVOCATION_CACHE, on by default when REDIS_URL is set, and otherwise
+each check is one indexed blacklist query. The Bloom filter holds at most
+BLOOM_MAX_TOKENS ids, past which the database is asked instead.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from uuid import uuid4
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .cache import get_cache
+
+REVOKED_TOKEN_KEY = 'api:revoked-token:{}'
+REVOCATION_EPOCH_KEY = 'api:revocation-epoch'
+
+# Token ids remembered as revoked by each process
+REVOKED_LRU_SIZE = 10_000
+
+# False positive rate of the Bloom filter, each costs one database lookup
+BLOOM_ERROR_RATE = 0.001
+# Most revoked token ids loaded into the Bloom filter of each process (about
+# 3.6 MB at this error rate); with more, every check asks the database
+BLOOM_MAX_TOKENS = 1_000_000
+# Ids read per query while loading the Bloom filter
+BLOOM_LOAD_CHUNK_SIZE = 10_000
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false positive rate"""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        step = int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * step) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationCache:
+    """Per-process front of the refresh token blacklist"""
+
+    def __init__(self, lru_size=REVOKED_LRU_SIZE):
+        self._lock = threading.Lock()
+        self._lru_size = lru_size
+        self._revoked = OrderedDict()
+        self._bloom = None
+        self._bloom_epoch = None
+
+    def is_revoked(self, jti):
+        if not settings.API_REVOCATION_CACHE:
+            return self.is_blacklisted(jti)
+        with self._lock:
+            if jti in self._revoked:
+                self._revoked.move_to_end(jti)
+                return True
+        if get_cache().get(REVOKED_TOKEN_KEY.format(jti)):
+            self.remember(jti)
+            return True
+        bloom = self._get_bloom()
+        if bloom is not None and jti not in bloom:
+            return False
+        # Bloom filters can answer "maybe", ask the database
+        if self.is_blacklisted(jti):
+            self.remember(jti)
+            return True
+        return False
+
+    def is_blacklisted(self, jti):
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def remember(self, jti):
+        with self._lock:
+            self._revoked[jti] = True
+            self._revoked.move_to_end(jti)
+            while len(self._revoked) > self._lru_size:
+                self._revoked.popitem(last=False)
+
+    def _get_bloom(self):
+        cache = get_cache()
+        epoch = cache.get(REVOCATION_EPOCH_KEY)
+        if epoch is None:
+            cache.add(REVOCATION_EPOCH_KEY, uuid4().hex, timeout=None)
+            epoch = cache.get(REVOCATION_EPOCH_KEY)
+        with self._lock:
+            if self._bloom_epoch != epoch:
+                self._bloom = self._load_bloom()
+                self._bloom_epoch = epoch
+            return self._bloom
+
+    def _load_bloom(self):
+        """The filter of the unexpired revoked ids, or None if there are too many"""
+        # Read after the epoch: everything revoked since is in the shared cache
+        revoked = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        count = revoked.count()
+        if count > BLOOM_MAX_TOKENS:
+            return None
+        # Room for the revocations made while loading and since
+        bloom = BloomFilter(2 * count + 1024)
+        for jti in revoked.values_list('token__jti', flat=True).iterator(chunk_size=BLOOM_LOAD_CHUNK_SIZE):
+            bloom.add(jti)
+        return bloom
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self._bloom = None
+            self._bloom_epoch = None
+
+
+revocation_cache = RevocationCache()
+
+
+def record_revocation(jti, expires_at):
+    """Publish a revocation to the shared cache once the current transaction commits"""
+    def publish():
+        timeout = math.ceil((expires_at - timezone.now()).total_seconds())
+        if timeout > 0:
+            get_cache().set(REVOKED_TOKEN_KEY.format(jti), True, timeout=timeout)
+        revocation_cache.remember(jti)
+    transaction.on_commit(publish)
@@ -2,12 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from .models import User, Project, TimeEntry
-from django.core.mail import send_mail
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from .reports import BUCKET_SIZES, MAX_REPORT_BUCKETS, bucket_count
+from .tasks import send_verification_email
 from django.utils import timezone
-import os
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -15,7 +12,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     
     class Meta:                                         
         model = User
-        fields = ('username', 'email', 'password', 'password_confirm')
+        fields = ('username', 'email', 'password', 'password_confirm', 'timezone')
     
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
@@ -26,33 +23,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         validated_data.pop('password_confirm')
         user = User.objects.create_user(**validated_data)
         
-        # Send verification email (disabled for production)
-        # self.send_verification_email(user)
-        
+        # Sent by a worker, so registration does not wait for the mail server
+        send_verification_email.delay(user_id=user.id)
         return user
-    
-    def send_verification_email(self, user):
-        subject = 'Verify Your Email Address'
-        frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
-        verification_url = f"{frontend_url}/verify-email/{user.email_verification_token}/"
-        
-        html_message = f"""
-        <h2>Welcome to Time Tracker!</h2>
-        <p>Please click the link below to verify your email address:</p>
-        <a href="{verification_url}">Verify Email</a>
-        <p>If you didn't create an account, please ignore this email.</p>
-        """
-        
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject,
-            plain_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
 
 class EmailVerificationSerializer(serializers.Serializer):
     token = serializers.UUIDField()
@@ -81,7 +54,7 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
         
         if email and password:
-            user = authenticate(username=email, password=password)
+            user = authenticate(self.context.get('request'), username=email, password=password)
             if not user:
                 raise serializers.ValidationError('Invalid credentials')
             # Email verification disabled for production
@@ -99,7 +72,7 @@ class ProjectSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
+        validated_data['user_id'] = self.context['request'].user.id
         return super().create(validated_data)
 
 class TimeEntrySerializer(serializers.ModelSerializer):
@@ -118,55 +91,132 @@ class TimeEntrySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'duration_seconds', 'created_at', 'updated_at']
     
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
+        validated_data['user_id'] = self.context['request'].user.id
         return super().create(validated_data)
 
-class StartTimerSerializer(serializers.Serializer):
-    project_id = serializers.IntegerField(required=False, allow_null=True)
-    description = serializers.CharField(required=False, allow_blank=True)
+def datetime_data(value, tzinfo):
+    """DateTimeField's ISO 8601 representation of an aware datetime"""
+    if value is None:
+        return None
+    value = value.astimezone(tzinfo).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+def time_entry_rows_data(rows):
+    """
+    What TimeEntrySerializer(many=True).data returns, built straight from
+    TimeEntry.objects.listing_values() rows: no model instances and no
+    per-field DRF calls, for the read-only listings. Keep the keys in step
+    with TimeEntrySerializer.Meta.fields.
+    """
+    tzinfo = timezone.get_current_timezone()
+    data = []
+    for row in rows:
+        duration = row['duration_seconds']
+        data.append({
+            'id': row['id'],
+            'project': row['project_id'],
+            'project_name': row['project__name'],
+            'project_color': row['project__color'],
+            'description': row['description'],
+            'start_time': datetime_data(row['start_time'], tzinfo),
+            'end_time': datetime_data(row['end_time'], tzinfo),
+            'duration_seconds': duration,
+            'duration_formatted': f"{duration // 3600:02d}:{duration % 3600 // 60:02d}:{duration % 60:02d}",
+            'status': row['status'],
+            'is_running': row['status'] == 'running' and row['end_time'] is None,
+            'created_at': datetime_data(row['created_at'], tzinfo),
+            'updated_at': datetime_data(row['updated_at'], tzinfo),
+        })
+    return data
+
+class TimeEntryFilterSerializer(serializers.Serializer):
+    """Query parameters for filtering a user's time entries"""
+    project = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=TimeEntry.STATUS_CHOICES, required=False)
     
-    def validate_project_id(self, value):
-        if value is None:
-            return value
-        try:
-            project = Project.objects.get(id=value, user=self.context['request'].user)
-            return value
-        except Project.DoesNotExist:
-            raise serializers.ValidationError("Project not found")
+    def get_fields(self):
+        fields = super().get_fields()
+        # 'from' and 'to' are Python keywords, so they cannot be declared as attributes
+        fields['from'] = serializers.DateTimeField(required=False)
+        fields['to'] = serializers.DateTimeField(required=False)
+        return fields
     
     def validate(self, attrs):
-        user = self.context['request'].user
-        
-        # Check if user already has a running timer
-        running_entry = TimeEntry.objects.filter(
-            user=user, 
-            status='running',
-            end_time__isnull=True
-        ).first()
-        
-        if running_entry:
-            raise serializers.ValidationError("You already have a running timer. Please stop it first.")
-        
+        if 'from' in attrs and 'to' in attrs and attrs['from'] >= attrs['to']:
+            raise serializers.ValidationError({'to': "Must be later than 'from'"})
         return attrs
+    
+    def filter_queryset(self, queryset):
+        """Apply the validated filters; `from` is inclusive and `to` exclusive"""
+        filters = self.validated_data
+        if 'from' in filters:
+            queryset = queryset.filter(start_time__gte=filters['from'])
+        if 'to' in filters:
+            queryset = queryset.filter(start_time__lt=filters['to'])
+        if 'project' in filters:
+            queryset = queryset.filter(project_id=filters['project'])
+        if 'status' in filters:
+            queryset = queryset.filter(status=filters['status'])
+        return queryset
 
-class StopTimerSerializer(serializers.Serializer):
-    time_entry_id = serializers.IntegerField()
+class ReportFilterSerializer(serializers.Serializer):
+    """Query parameters of a report; days are in the user's timezone"""
+    group_by = serializers.ChoiceField(choices=BUCKET_SIZES, default='day')
+    project = serializers.IntegerField(required=False)
+    breakdown = serializers.BooleanField(default=False)
     
-    def validate_time_entry_id(self, value):
-        try:
-            time_entry = TimeEntry.objects.get(
-                id=value, 
-                user=self.context['request'].user,
-                status='running'
+    def get_fields(self):
+        fields = super().get_fields()
+        # 'to' is exclusive, like for time entries
+        fields['from'] = serializers.DateField()
+        fields['to'] = serializers.DateField()
+        return fields
+    
+    def validate(self, attrs):
+        if attrs['from'] >= attrs['to']:
+            raise serializers.ValidationError({'to': "Must be later than 'from'"})
+        if bucket_count(attrs['from'], attrs['to'], attrs['group_by']) > MAX_REPORT_BUCKETS:
+            raise serializers.ValidationError(
+                {'to': f"A report spans at most {MAX_REPORT_BUCKETS} buckets, use a larger group_by"}
             )
-            return value
-        except TimeEntry.DoesNotExist:
-            raise serializers.ValidationError("Running time entry not found")
+        return attrs
+
+class TimeEntryImportSerializer(serializers.Serializer):
+    """
+    One row of a batch import. Expects `project_ids` ({id: name}) and
+    `project_names` ({name: id}) of the user's projects in the context, so a
+    whole batch is checked against a single projects query.
+    """
+    id = serializers.IntegerField(required=False)
+    project_id = serializers.IntegerField(required=False, allow_null=True)
+    project_name = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    
+    def validate(self, attrs):
+        if attrs['end_time'] < attrs['start_time']:
+            raise serializers.ValidationError({'end_time': "Must not be earlier than start_time"})
+        
+        project_id = attrs.pop('project_id', None)
+        project_name = attrs.pop('project_name', None)
+        if project_id is not None:
+            if project_id not in self.context['project_ids']:
+                raise serializers.ValidationError({'project_id': "Project not found"})
+        elif project_name:
+            project_id = self.context['project_names'].get(project_name)
+            if project_id is None:
+                raise serializers.ValidationError({'project_name': "Project not found"})
+        attrs['project_id'] = project_id
+        return attrs
 
-class TimeEntrySummarySerializer(serializers.Serializer):
-    """Serializer for time tracking summary data"""
-    total_time_today = serializers.CharField()
-    total_time_this_week = serializers.CharField()
-    total_time_this_month = serializers.CharField()
-    running_timer = TimeEntrySerializer(required=False)
-    recent_entries = TimeEntrySerializer(many=True)
+class StartTimerSerializer(serializers.Serializer):
+    # Project ownership and a running timer are checked when the entry is inserted, see TimeEntryManager.start_timer
+    project_id = serializers.IntegerField(required=False, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True)
+
+class StopTimerSerializer(serializers.Serializer):
+    # Ownership and running state are checked when the entry is updated, see TimeEntryManager.stop_timer
+    time_entry_id = serializers.IntegerField()
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import bump_user_version, forget_user_is_active
+from .models import Project, TimeEntry, User
+
+
+# Deleted time entries update their rollups and ETags in TimeEntry.delete() and
+# TimeEntryQuerySet.delete(): a delete receiver on TimeEntry would make Django
+# load and delete a user's or project's entries one by one.
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+@receiver(post_save, sender=TimeEntry)
+def invalidate_user_version(sender, instance, **kwargs):
+    """Any write to a user's data invalidates the ETags of their cached responses"""
+    bump_user_version(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_is_active(sender, instance, **kwargs):
+    """Deactivating or deleting a user locks them out of token-mode authentication"""
+    forget_user_is_active(instance.pk)
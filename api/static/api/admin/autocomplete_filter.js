@@ -0,0 +1,12 @@
+'use strict';
+{
+    const $ = django.jQuery;
+    // Reload the changelist filtered by the object picked in an AutocompleteFilter
+    $(document).on('change', '.admin-autocomplete-filter', function() {
+        const url = new URL(this.dataset.clearUrl, window.location.href);
+        if (this.value) {
+            url.searchParams.set(this.dataset.lookup, this.value);
+        }
+        window.location.href = url.href;
+    });
+}
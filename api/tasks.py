@@ -0,0 +1,34 @@
+"""Background tasks, run by `manage.py run_worker` (see api.queue)"""
+import os
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.html import strip_tags
+from .models import User
+from .queue import task
+
+
+@task(max_attempts=8)
+def send_verification_email(user_id):
+    # The user may have been verified or deleted since the task was queued
+    user = User.objects.filter(pk=user_id, is_email_verified=False).first()
+    if user is None:
+        return
+    
+    frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+    verification_url = f"{frontend_url}/verify-email/{user.email_verification_token}/"
+    
+    html_message = f"""
+    <h2>Welcome to Time Tracker!</h2>
+    <p>Please click the link below to verify your email address:</p>
+    <a href="{verification_url}">Verify Email</a>
+    <p>If you didn't create an account, please ignore this email.</p>
+    """
+    
+    send_mail(
+        'Verify Your Email Address',
+        strip_tags(html_message),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        html_message=html_message,
+        fail_silently=False,
+    )
@@ -1,3 +1,1084 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import threading
+from base64 import urlsafe_b64encode
+from asgiref.sync import sync_to_async
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
+from zoneinfo import ZoneInfo
+from django.contrib.auth import authenticate
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, migrations, models, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from . import async_views, partitioning, revocation
+from .async_views import event_stream
+from .cache import get_cache, get_user_timezone
+from .dashboard import summary_entries, summary_totals
+from .events import InMemoryBroker, get_broker
+from .hashers import get_hashing_pool
+from .imports import import_time_entries
+from .models import DailyRollup, Task, User, Project, TimeEntry
+from .pagination import EstimatedCountPaginator
+from .queue import TASKS, Worker, retry_delay, task
+from .renderers import FastJSONRenderer
+from .serializers import TimeEntrySerializer, time_entry_rows_data
+from .revocation import revocation_cache
+from .seeding import seed
+from .tokens import RefreshToken
 
-# Create your tests here.
+
+class QueryPlanTests(TestCase):
+    """Hot queries must be answered from an index, not a full table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='plan', email='plan@example.com', password='pw')
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw')
+        now = timezone.now()
+        for owner in (cls.user, other):
+            project = Project.objects.create(name='Project', user=owner)
+            # Mostly archived projects, as active ones are the few a user works on
+            Project.objects.bulk_create([Project(name=f'Old {i}', user=owner, is_active=False) for i in range(20)])
+            TimeEntry.objects.bulk_create([
+                TimeEntry(
+                    user=owner, project=project, status='stopped',
+                    start_time=now - timedelta(hours=i + 1), end_time=now - timedelta(hours=i)
+                )
+                for i in range(50)
+            ])
+        # Many users, so that a user's rows are a small part of each table
+        owners = User.objects.bulk_create([
+            User(username=f'owner{i}', email=f'owner{i}@example.com') for i in range(50)
+        ])
+        Project.objects.bulk_create([Project(name=f'Project {i}', user=owner) for owner in owners for i in range(3)])
+        # Statistics let the planner tell the indexes apart
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, table, index):
+        """The query reads `table` through `index`, never with a full scan"""
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan, so make the planner prefer any usable index
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertNotRegex(plan, rf'\bSCAN {table}\b(?! USING)')
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}')
+        # The foreign key index on user_id alone would also avoid a scan
+        self.assertIn(index, plan)
+
+    def test_recent_entries_use_index(self):
+        queryset = TimeEntry.objects.filter(user=self.user).order_by('-start_time')[:50]
+        self.assertUsesIndex(queryset, 'api_timeentry', 'api_te_user_start_idx')
+
+    def test_start_time_range_uses_index(self):
+        queryset = TimeEntry.objects.filter(
+            user=self.user,
+            start_time__gte=timezone.now() - timedelta(days=7)
+        ).order_by('-start_time')
+        self.assertUsesIndex(queryset, 'api_timeentry', 'api_te_user_start_idx')
+
+    def test_running_timer_uses_index(self):
+        queryset = TimeEntry.objects.filter(user=self.user, status='running', end_time__isnull=True)
+        self.assertUsesIndex(queryset, 'api_timeentry', 'api_te_one_running_per_user')
+
+    def test_dashboard_entries_use_index(self):
+        for index in ('api_te_user_start_idx', 'api_te_one_running_per_user'):
+            self.assertUsesIndex(summary_entries(self.user.id), 'api_timeentry', index)
+
+    def test_active_projects_use_index(self):
+        queryset = Project.objects.filter(user=self.user, is_active=True)
+        self.assertUsesIndex(queryset, 'api_project', 'api_project_user_active_idx')
+
+    def test_admin_changelist_uses_index(self):
+        queryset = TimeEntry.objects.order_by('-start_time', '-id')[:100]
+        self.assertUsesIndex(queryset, 'api_timeentry', 'api_te_start_idx')
+
+
+
+class RollupTests(TestCase):
+    """Writes keep the daily rollups equal to the totals of the stopped entries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='rollup', email='rollup@example.com', password='pw')
+        cls.project = Project.objects.create(name='First', user=cls.user)
+        cls.other_project = Project.objects.create(name='Second', user=cls.user)
+        cls.start = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=1)
+
+    def entry(self, project=None, hours=0, minutes=30):
+        start_time = self.start + timedelta(hours=hours)
+        return TimeEntry.objects.create(
+            user=self.user, project=project, status='stopped',
+            start_time=start_time, end_time=start_time + timedelta(minutes=minutes)
+        )
+
+    def rollups(self):
+        return {
+            (row.project_id, row.day): (row.total_seconds, row.entry_count)
+            for row in DailyRollup.objects.filter(user=self.user)
+        }
+
+    def test_stop_timer(self):
+        running = TimeEntry.objects.create(
+            user=self.user, project=self.project, status='running', start_time=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(self.rollups(), {})
+        stopped = TimeEntry.objects.stop_timer(self.user.id, running.id)
+        self.assertEqual(self.rollups(), {
+            (self.project.id, stopped.start_time.date()): (stopped.duration_seconds, 1)
+        })
+        self.assertGreaterEqual(stopped.duration_seconds, 3600)
+
+    def test_edit_moves_entry(self):
+        entry = self.entry(self.project)
+        self.entry(self.other_project, hours=1, minutes=10)
+        entry.project = self.other_project
+        entry.end_time += timedelta(minutes=15)
+        entry.save()
+        # The emptied row is deleted, not left at zero
+        self.assertEqual(self.rollups(), {(self.other_project.id, self.start.date()): (55 * 60, 2)})
+
+    def test_delete(self):
+        first = self.entry(self.project)
+        self.entry(self.project, hours=1)
+        self.entry(hours=2)
+        self.entry(hours=3)
+        first.delete()
+        self.assertEqual(self.rollups(), {
+            (self.project.id, self.start.date()): (1800, 1),
+            (None, self.start.date()): (3600, 2),
+        })
+        TimeEntry.objects.filter(user=self.user, project__isnull=True).delete()
+        self.assertEqual(self.rollups(), {(self.project.id, self.start.date()): (1800, 1)})
+
+    def test_delete_project_in_one_statement(self):
+        for hour in range(20):
+            self.entry(self.project, hours=hour, minutes=10)
+        self.entry(self.other_project)
+        with CaptureQueriesContext(connection) as context:
+            self.project.delete()
+        # Entries and rollups go with the project, without loading the entries
+        self.assertLess(len(context), 10)
+        self.assertEqual(self.rollups(), {(self.other_project.id, self.start.date()): (1800, 1)})
+        self.assertEqual(TimeEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_entries_without_project(self):
+        self.entry(hours=0)
+        self.entry(hours=1)
+        self.assertEqual(self.rollups(), {(None, self.start.date()): (3600, 2)})
+        # What a concurrent writer would attempt: no second row for the same day
+        DailyRollup.objects.bulk_create([
+            DailyRollup(user=self.user, project=None, day=self.start.date())
+        ], ignore_conflicts=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyRollup.objects.create(user=self.user, project=None, day=self.start.date())
+        self.assertEqual(self.rollups(), {(None, self.start.date()): (3600, 2)})
+
+    def test_rebuild(self):
+        self.entry(self.project)
+        self.entry(hours=1)
+        self.entry(self.project, hours=26)
+        TimeEntry.objects.create(user=self.user, project=self.project, status='running', start_time=self.start)
+        expected = self.rollups()
+        DailyRollup.objects.update(total_seconds=0)
+        DailyRollup.objects.create(user=self.user, project=self.other_project, day=self.start.date(), entry_count=3)
+        self.assertEqual(DailyRollup.objects.rebuild(user_ids=[self.user.id]), 3)
+        self.assertEqual(self.rollups(), expected)
+        self.assertEqual(expected[(self.project.id, self.start.date())], (1800, 1))
+
+@override_settings(API_QUERY_CHECK='raise')
+class UserTimezoneTests(TestCase):
+    """Dashboard days are the user's days, and follow a change of timezone"""
+
+    def test_dashboard_today(self):
+        start_time = timezone.now().replace(microsecond=0) - timedelta(minutes=10)
+        # A timezone in which the entry falls on another date than in UTC
+        timezone_name = 'Pacific/Kiritimati' if start_time.hour >= 10 else 'Pacific/Pago_Pago'
+        tzinfo = ZoneInfo(timezone_name)
+        self.assertNotEqual(timezone.localdate(start_time, tzinfo), start_time.date())
+        user = User.objects.create_user(username='far', email='far@example.com', password='pw', timezone=timezone_name)
+        TimeEntry.objects.create(user=user, start_time=start_time, end_time=start_time + timedelta(minutes=5))
+
+        self.assertEqual(DailyRollup.objects.get(user=user).day, timezone.localdate(start_time, tzinfo))
+        self.assertEqual(summary_totals(user.id, tzinfo)['today'], 300)
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/dashboard/').json()['total_time_today'], '0h 5m')
+
+    def test_timezone_change_rebuilds_rollups(self):
+        user = User.objects.create_user(username='mover', email='mover@example.com', password='pw')
+        start_time = datetime(2026, 1, 1, 23, 30, tzinfo=dt_timezone.utc)
+        TimeEntry.objects.create(user=user, start_time=start_time, end_time=start_time + timedelta(minutes=20))
+        self.assertEqual(DailyRollup.objects.get(user=user).day, date(2026, 1, 1))
+
+        user.timezone = 'Asia/Tokyo'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        rollup = DailyRollup.objects.get(user=user)
+        self.assertEqual((rollup.day, rollup.total_seconds), (date(2026, 1, 2), 1200))
+        self.assertEqual(get_user_timezone(user.id), ZoneInfo('Asia/Tokyo'))
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Each endpoint runs a fixed number of queries, however many rows it
+    returns, and none of them repeatedly (N+1) or slowly.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='budget', email='budget@example.com', password='pw')
+        now = timezone.now()
+        for i in range(5):
+            project = Project.objects.create(name=f'Project {i}', user=cls.user)
+            for j in range(5):
+                start_time = now - timedelta(hours=i * 5 + j + 1)
+                TimeEntry.objects.create(
+                    user=cls.user, project=project, status='stopped',
+                    start_time=start_time, end_time=start_time + timedelta(minutes=30)
+                )
+        cls.project = project
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertQueryBudget(self, budget, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, response.content)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(len(context), budget, f'{method.upper()} {url} ran:\n{queries}')
+        return response
+
+    def test_projects(self):
+        self.assertQueryBudget(1, 'get', '/api/projects/')
+
+    def test_time_entries(self):
+        response = self.assertQueryBudget(1, 'get', '/api/time-entries/')
+        self.assertEqual(len(response.data), 25)
+
+    def test_timer_status(self):
+        TimeEntry.objects.start_timer(self.user.id, project_id=self.project.id)
+        self.assertQueryBudget(1, 'get', '/api/timer/status/')
+
+    def test_dashboard(self):
+        TimeEntry.objects.start_timer(self.user.id, project_id=self.project.id)
+        response = self.assertQueryBudget(2, 'get', '/api/dashboard/')
+        self.assertEqual(len(response.data['recent_entries']), 10)
+
+    def test_reports(self):
+        today = timezone.localdate()
+        response = self.assertQueryBudget(1, 'get', '/api/reports/', {
+            'from': today - timedelta(days=365), 'to': today + timedelta(days=1),
+            'group_by': 'week', 'breakdown': 'true'
+        })
+        self.assertEqual(response.data['total_seconds'], 25 * 1800)
+        self.assertEqual(len(response.data['projects']), 5)
+
+    def test_start_timer(self):
+        # Project ownership is checked by the INSERT itself
+        self.assertQueryBudget(1, 'post', '/api/timer/start/', {'project_id': self.project.id})
+
+    def test_stop_timer(self):
+        time_entry = TimeEntry.objects.start_timer(self.user.id, project_id=self.project.id)
+        # UPDATE ... RETURNING, the rollup upsert (with its savepoints) and the project
+        self.assertQueryBudget(8, 'post', '/api/timer/stop/', {'time_entry_id': time_entry.id})
+
+
+
+
+class TimerTests(TestCase):
+    """A user has at most one running timer, and a timer stops once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='timer', email='timer@example.com', password='pw')
+        cls.project = Project.objects.create(name='Project', user=cls.user)
+        cls.token = str(RefreshToken.for_user(cls.user).access_token)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_second_start_rejected(self):
+        for prefix in ('/api/', '/api/async/'):
+            with self.subTest(prefix=prefix):
+                response = self.client.post(f'{prefix}timer/start/', {'project_id': self.project.id}, format='json')
+                self.assertEqual(response.status_code, 201, response.content)
+                response = self.client.post(f'{prefix}timer/start/', {}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('non_field_errors', response.json())
+                self.assertEqual(TimeEntry.objects.filter(user=self.user, status='running').count(), 1)
+                TimeEntry.objects.filter(user=self.user).delete()
+
+    def test_other_users_project_rejected(self):
+        other = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        project = Project.objects.create(name='Theirs', user=other)
+        for prefix in ('/api/', '/api/async/'):
+            with self.subTest(prefix=prefix):
+                response = self.client.post(f'{prefix}timer/start/', {'project_id': project.id}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'project_id': ['Project not found']})
+                self.assertFalse(TimeEntry.objects.exists())
+                response = self.client.post(f'{prefix}timer/start/', {'project_id': self.project.id}, format='json')
+                self.assertEqual(response.status_code, 201, response.content)
+                self.assertEqual(response.json()['project_name'], 'Project')
+                TimeEntry.objects.filter(user=self.user).delete()
+
+    def test_second_stop_rejected(self):
+        for prefix in ('/api/', '/api/async/'):
+            with self.subTest(prefix=prefix):
+                time_entry = TimeEntry.objects.start_timer(self.user.id, project_id=self.project.id)
+                response = self.client.post(f'{prefix}timer/stop/', {'time_entry_id': time_entry.id}, format='json')
+                self.assertEqual(response.status_code, 200, response.content)
+                end_time = TimeEntry.objects.get(pk=time_entry.pk).end_time
+                response = self.client.post(f'{prefix}timer/stop/', {'time_entry_id': time_entry.id}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('time_entry_id', response.json())
+                self.assertEqual(TimeEntry.objects.get(pk=time_entry.pk).end_time, end_time)
+                self.assertEqual(DailyRollup.objects.get(user=self.user).entry_count, 1)
+                TimeEntry.objects.filter(user=self.user).delete()
+
+    def test_unique_running_timer_constraint(self):
+        TimeEntry.objects.create(user=self.user, status='running', start_time=timezone.now())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TimeEntry.objects.create(user=self.user, status='running', start_time=timezone.now())
+        # Stopped entries and other users are not affected
+        TimeEntry.objects.create(user=self.user, status='stopped', start_time=timezone.now(), end_time=timezone.now())
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw')
+        TimeEntry.objects.create(user=other, status='running', start_time=timezone.now())
+
+
+@override_settings(API_REVOCATION_CACHE=True)
+class RefreshTokenTests(TestCase):
+    """A refresh token works once, and not at all after logout, whatever the caches hold"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='refresh', email='refresh@example.com', password='pw')
+
+    def setUp(self):
+        self.clear_caches()
+
+    def clear_caches(self):
+        revocation_cache.clear()
+        get_cache().clear()
+
+    def post(self, url, token):
+        # Revocations reach the caches when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {'refresh': token}, content_type='application/json')
+
+    def refresh(self, token):
+        return self.post('/api/auth/refresh/', token)
+
+    def test_rotation(self):
+        token = str(RefreshToken.for_user(self.user))
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()['refresh']
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.clear_caches()
+        # Answered from the database through the rebuilt Bloom filter
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(rotated).status_code, 200)
+
+    def test_logout(self):
+        token = str(RefreshToken.for_user(self.user))
+        self.assertEqual(self.post('/api/auth/logout/', token).status_code, 204)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.post('/api/auth/logout/', token).status_code, 401)
+        self.clear_caches()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_revoked_without_caches(self):
+        # The LRU and shared cache missed the revocation (e.g. it was flushed
+        # before the Bloom filter was rebuilt): the blacklist row still wins
+        token = str(RefreshToken.for_user(self.user))
+        RefreshToken(token).blacklist()
+        self.clear_caches()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_too_many_for_bloom(self):
+        token = str(RefreshToken.for_user(self.user))
+        RefreshToken(token).blacklist()
+        self.clear_caches()
+        with mock.patch.object(revocation, 'BLOOM_MAX_TOKENS', 0):
+            self.assertEqual(self.refresh(token).status_code, 401)
+            self.assertEqual(self.refresh(str(RefreshToken.for_user(self.user))).status_code, 200)
+        self.assertIsNone(revocation_cache._bloom)
+
+    def test_without_revocation_cache(self):
+        # Another worker with its own local cache revoked the token after
+        # this one built its Bloom filter
+        self.assertEqual(self.refresh(str(RefreshToken.for_user(self.user))).status_code, 200)
+        token = RefreshToken.for_user(self.user)
+        outstanding = OutstandingToken.objects.get(jti=token[api_settings.JTI_CLAIM])
+        BlacklistedToken.objects.create(token=outstanding)
+        # Rotation is still refused by the blacklist's unique constraint
+        self.assertEqual(self.refresh(str(token)).status_code, 401)
+        with override_settings(API_REVOCATION_CACHE=False), self.assertRaises(TokenError):
+            RefreshToken(str(token))
+
+
+@override_settings(API_AUTH_USER_MODE='token', API_AUTH_ACTIVE_CACHE_TTL=30)
+class TokenUserModeTests(TestCase):
+    """In token mode requests never load the user, and deactivation takes effect once the cache is invalidated"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='token', email='token@example.com', password='pw')
+        cls.headers = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    def setUp(self):
+        get_cache().clear()
+
+    def deactivate(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['is_active'])
+
+    def test_no_user_query(self):
+        # The first request caches the active flag
+        self.assertEqual(self.client.get('/api/timer/status/', headers=self.headers).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/timer/status/', headers=self.headers).status_code, 200)
+        self.assertFalse([query['sql'] for query in queries if User._meta.db_table in query['sql']])
+
+    def test_deactivated_user(self):
+        self.assertEqual(self.client.get('/api/timer/status/', headers=self.headers).status_code, 200)
+        self.deactivate()
+        self.assertEqual(self.client.get('/api/timer/status/', headers=self.headers).status_code, 401)
+
+    async def test_async_deactivated_user(self):
+        response = await self.async_client.get('/api/async/timer/status/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        await sync_to_async(self.deactivate)()
+        response = await self.async_client.get('/api/async/timer/status/', headers=self.headers)
+        self.assertEqual(response.status_code, 401)
+
+
+class ConditionalRequestTests(TestCase):
+    """Unchanged polls are answered with 304, and any write changes the ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='etag', email='etag@example.com', password='pw')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_poll_and_write(self):
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A write carrying the ETag is not treated as a conditional request
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/projects/', {'name': 'New'}, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 201, response.content)
+
+        response = self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([project['name'] for project in response.data], ['New'])
+
+    def test_etag_per_url(self):
+        first, second = (Project.objects.create(name=name, user=self.user) for name in ('First', 'Second'))
+        for urls in [
+            (f'/api/projects/{first.id}/', f'/api/projects/{second.id}/'),
+            ('/api/reports/?from=2026-01-01&to=2026-02-01', '/api/reports/?from=2026-01-01&to=2026-03-01'),
+            ('/api/reports/?from=2026-01-01&to=2026-02-01', '/api/reports/?from=2026-01-01&to=2026-02-01&group_by=week'),
+        ]:
+            with self.subTest(urls=urls):
+                responses = [self.client.get(url) for url in urls]
+                self.assertEqual([response.status_code for response in responses], [200, 200])
+                self.assertNotEqual(responses[0]['ETag'], responses[1]['ETag'])
+                # Nor does one URL's ETag validate the other's content
+                response = self.client.get(urls[1], HTTP_IF_NONE_MATCH=responses[0]['ETag'])
+                self.assertEqual(response.status_code, 200)
+
+
+# The same store setting again, so that the buckets start full
+@override_settings(
+    API_THROTTLE_RATES={'login': '2/min', 'refresh': '2/min', 'timer': '2/min'},
+    API_THROTTLE_STORE='api.throttling.LocalBucketStore',
+)
+class ThrottleTests(TestCase):
+    """An empty bucket answers 429 before the view runs a query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='throttle', email='throttle@example.com', password='pw')
+        cls.token = str(RefreshToken.for_user(cls.user).access_token)
+
+    def assertThrottled(self, url, data, **headers):
+        for _ in range(2):
+            self.assertNotEqual(self.client.post(url, data, content_type='application/json', **headers).status_code, 429)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, data, content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(len(context), 0, [query['sql'] for query in context.captured_queries])
+
+    def test_login(self):
+        # Without a password, so that no hashing slows the test down
+        self.assertThrottled('/api/auth/login/', {'email': 'throttle@example.com'})
+
+    def test_refresh(self):
+        self.assertThrottled('/api/auth/refresh/', {'refresh': 'not-a-token'})
+
+    def test_timer(self):
+        self.assertThrottled('/api/timer/start/', {}, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        # The async endpoint draws from the same bucket of the same user
+        response = self.client.post(
+            '/api/async/timer/stop/', {}, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {self.token}'
+        )
+        self.assertEqual(response.status_code, 429)
+        # Other clients keep their own buckets
+        response = self.client.post('/api/timer/start/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+
+class CursorPaginationTests(TestCase):
+    """Following `next` visits every entry once, newest first, even among equal start times"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cursor', email='cursor@example.com', password='pw')
+        start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        # Groups of 3 entries starting at the same second, so pages split them
+        TimeEntry.objects.bulk_create([
+            TimeEntry(
+                user=cls.user, status='stopped', description=str(i),
+                start_time=start - timedelta(hours=i // 3), end_time=start - timedelta(hours=i // 3) + timedelta(minutes=5)
+            )
+            for i in range(11)
+        ])
+        cls.expected = list(
+            TimeEntry.objects.filter(user=cls.user).order_by('-start_time', '-id').values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_walk(self):
+        seen = []
+        url = '/api/time-entries/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [entry['id'] for entry in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, self.expected)
+
+    def test_plain_list(self):
+        # Clients that do not ask for pages keep getting the first one as a list
+        response = self.client.get('/api/time-entries/', {'status': 'stopped'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['id'] for entry in response.data], self.expected)
+
+    def test_invalid_cursor(self):
+        for cursor in ('not base64!', 'bm90IGEgY3Vyc29y', urlsafe_b64encode(b'yesterday|1').decode()):
+            response = self.client.get('/api/time-entries/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_bad_page_size(self):
+        for page_size in ('0', '201', 'ten'):
+            response = self.client.get('/api/time-entries/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 400, page_size)
+            self.assertIn('page_size', response.data)
+        response = self.client.get('/api/time-entries/', {'page_size': '200'})
+        self.assertEqual(len(response.data['results']), 11)
+        self.assertIsNone(response.data['next'])
+
+
+class ImportTests(TestCase):
+    """Batch imports create and update entries, report bad rows and keep the rollups right"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='import', email='import@example.com', password='pw')
+        cls.alpha = Project.objects.create(name='Alpha', user=cls.user)
+        cls.beta = Project.objects.create(name='Beta', user=cls.user)
+        cls.start = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=2)
+        cls.existing = TimeEntry.objects.create(
+            user=cls.user, project=cls.alpha, start_time=cls.start + timedelta(hours=5),
+            end_time=cls.start + timedelta(hours=6)
+        )
+        other = User.objects.create_user(username='stranger', email='stranger@example.com', password='pw')
+        cls.foreign = TimeEntry.objects.create(user=other, start_time=cls.start, end_time=cls.start + timedelta(hours=1))
+
+    def at(self, hours):
+        return (self.start + timedelta(hours=hours)).isoformat()
+
+    def test_import(self):
+        rows = [
+            {'project_name': 'Beta', 'start_time': self.at(0), 'end_time': self.at(1)},
+            {'start_time': self.at(1), 'end_time': self.at(0)},
+            {'description': 'No project', 'start_time': self.at(2), 'end_time': self.at(2.5)},
+            {'id': self.existing.id, 'project_id': self.beta.id, 'start_time': self.at(5), 'end_time': self.at(7)},
+            {'id': self.foreign.id, 'start_time': self.at(8), 'end_time': self.at(9)},
+            {'project_name': 'Gamma', 'start_time': self.at(10), 'end_time': self.at(11)},
+        ]
+        # Batches of 3: row indexes in the report count from the first row
+        report = import_time_entries(self.user.id, rows, batch_size=3)
+        self.assertEqual((report['created'], report['updated']), (2, 1))
+        self.assertEqual(
+            [(error['row'], list(error['errors'])) for error in report['errors']],
+            [(1, ['end_time']), (4, ['id']), (5, ['project_name'])]
+        )
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.project_id, self.existing.duration_seconds), (self.beta.id, 7200))
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.end_time, self.start + timedelta(hours=1))
+        rollups = {
+            (row.project_id, row.day): (row.total_seconds, row.entry_count)
+            for row in DailyRollup.objects.filter(user=self.user)
+        }
+        self.assertEqual(rollups, {
+            (self.beta.id, self.start.date()): (3 * 3600, 2),
+            (None, self.start.date()): (1800, 1),
+        })
+
+    def test_batch_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/time-entries/batch/', [
+            {'id': self.existing.id, 'start_time': self.at(5), 'end_time': self.at(5.5)},
+            {'id': self.existing.id, 'start_time': self.at(5), 'end_time': self.at(6)},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 1)
+        self.assertEqual(DailyRollup.objects.get(user=self.user).total_seconds, 1800)
+        response = client.post('/api/time-entries/batch/', {'start_time': self.at(0)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(API_TASKS_EAGER=False, API_TASK_RETRY_DELAY=10, API_TASK_RETRY_MAX_DELAY=60)
+class TaskQueueTests(TestCase):
+    """Tasks are queued with the request's transaction and run, retried or failed by a worker"""
+
+    def register(self, email):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/register/', {
+                'username': email.split('@')[0], 'email': email,
+                'password': 'Correct-horse-42', 'password_confirm': 'Correct-horse-42',
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return User.objects.get(email=email)
+
+    def test_registration_email(self):
+        user = self.register('queued@example.com')
+        queued = Task.objects.get()
+        self.assertEqual((queued.name, queued.kwargs, queued.status), (
+            'api.tasks.send_verification_email', {'user_id': user.id}, 'pending'
+        ))
+        # Sent by the worker, not during the request
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Worker().run_batch(), 1)
+        self.assertEqual(mail.outbox[0].to, ['queued@example.com'])
+        self.assertIn(str(user.email_verification_token), mail.outbox[0].alternatives[0].content)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.locked_by), ('done', 1, ''))
+        self.assertEqual(Worker().run_batch(), 0)
+
+    @override_settings(API_TASKS_EAGER=True)
+    def test_eager(self):
+        self.register('eager@example.com')
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(mail.outbox[0].to, ['eager@example.com'])
+
+    def test_retry_then_fail(self):
+        def flaky():
+            raise ConnectionError('SMTP server unavailable')
+        flaky = task(max_attempts=2)(flaky)
+        self.addCleanup(TASKS.pop, flaky.task_name)
+
+        queued = flaky.delay()
+        worker = Worker()
+        with self.assertLogs('api.tasks', 'WARNING'):
+            self.assertEqual(worker.run_batch(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+        self.assertIn('SMTP server unavailable', queued.last_error)
+        self.assertTrue(5 <= (queued.run_at - timezone.now()).total_seconds() <= 10)
+        # Not due before its backoff
+        self.assertEqual(worker.run_batch(), 0)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('api.tasks', 'ERROR'):
+            self.assertEqual(worker.run_batch(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_retry_delay(self):
+        for attempts, low, high in ((1, 5, 10), (2, 10, 20), (3, 20, 40), (10, 30, 60)):
+            self.assertTrue(low <= retry_delay(attempts) <= high, attempts)
+
+    def test_stale_task_requeued(self):
+        user = User.objects.create_user(username='stale', email='stale@example.com', password='pw')
+        Task.objects.create(
+            name='api.tasks.send_verification_email', kwargs={'user_id': user.id}, status='running',
+            attempts=1, locked_by='dead-worker', locked_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(Worker().run_batch(), 1)
+        self.assertEqual(Task.objects.get().status, 'done')
+        self.assertEqual(len(mail.outbox), 1)
+
+class FailingBroker(InMemoryBroker):
+    def publish(self, user_id, event):
+        raise ConnectionError('broker unavailable')
+
+
+class TimerEventsTests(TestCase):
+    """Committed changes reach the user's event streams, and a broker failure does not fail them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='events', email='events@example.com', password='pw')
+        cls.token = str(RefreshToken.for_user(cls.user).access_token)
+
+    def start_timer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/timer/start/', {}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_refused_under_wsgi(self):
+        response = self.client.get('/api/timer/events/', {'access_token': self.token})
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    async def test_timer_started_event(self):
+        subscription = get_broker().subscribe(self.user.id)
+        try:
+            timer = await sync_to_async(self.start_timer)()
+            event = await subscription.get(timeout=1)
+        finally:
+            subscription.close()
+        self.assertEqual(event, {'type': 'timer.started', 'data': timer})
+
+    async def test_event_stream(self):
+        with mock.patch.object(async_views, 'HEARTBEAT_INTERVAL', 0.01):
+            stream = event_stream(self.user.id)
+            self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+            get_broker().publish(self.user.id, {'type': 'project.deleted', 'data': {'id': 1}})
+            self.assertEqual(await anext(stream), 'event: project.deleted\ndata: {"id": 1}\n\n')
+            # Idle streams get a comment line
+            self.assertEqual(await anext(stream), ': keep-alive\n\n')
+            await stream.aclose()
+        self.assertNotIn(self.user.id, get_broker()._subscriptions)
+
+    @override_settings(EVENTS_BROKER='api.tests.FailingBroker')
+    def test_broker_failure(self):
+        with self.assertLogs('django', 'ERROR'):
+            self.start_timer()
+        self.assertTrue(TimeEntry.objects.filter(user=self.user, status='running').exists())
+
+
+class ExportTests(TestCase):
+    """Both export formats, streamed synchronously under WSGI and asynchronously under ASGI"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='export', email='export@example.com', password='pw')
+        cls.token = str(RefreshToken.for_user(cls.user).access_token)
+        project = Project.objects.create(name='+Client', user=cls.user)
+        start_time = timezone.now() - timedelta(days=1)
+        cls.descriptions = ['=HYPERLINK("http://example.com")', '-5 minutes', '@mention', 'Plain, "quoted"', '']
+        for i, description in enumerate(cls.descriptions):
+            TimeEntry.objects.create(
+                user=cls.user, project=project if i else None, description=description, status='stopped',
+                start_time=start_time + timedelta(hours=i), end_time=start_time + timedelta(hours=i, minutes=30)
+            )
+
+    def export(self, export_format):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/time-entries/export/', {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        header, *rows = csv.reader(io.StringIO(self.export('csv')))
+        self.assertEqual(header[:4], ['id', 'project_id', 'project_name', 'description'])
+        # Cells spreadsheets would run as formulas are quoted
+        self.assertEqual([row[3] for row in rows], [
+            '\'=HYPERLINK("http://example.com")', "'-5 minutes", "'@mention", 'Plain, "quoted"', ''
+        ])
+        self.assertEqual([row[2] for row in rows], ['', "'+Client", "'+Client", "'+Client", "'+Client"])
+        self.assertEqual(rows[0][6], '1800')
+
+    def test_csv_round_trip(self):
+        # Text that already looks quoted survives too
+        TimeEntry.objects.filter(description='').update(description="'=quoted")
+        expected = list(TimeEntry.objects.order_by('start_time').values_list('project__name', 'description', 'end_time'))
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', newline='') as file:
+            file.write(self.export('csv'))
+            file.flush()
+            TimeEntry.objects.all().delete()
+            call_command('import_entries', file.name, user=self.user.email, stdout=io.StringIO())
+        self.assertEqual(list(TimeEntry.objects.order_by('start_time').values_list('project__name', 'description', 'end_time')), expected)
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual([row['description'] for row in rows], self.descriptions)
+        self.assertEqual(rows[0]['project_id'], None)
+        self.assertEqual(rows[1]['project_name'], '+Client')
+
+    async def test_asgi_streams_asynchronously(self):
+        for export_format in ('csv', 'ndjson'):
+            response = await self.async_client.get(
+                '/api/time-entries/export/', {'format': export_format},
+                headers={'Authorization': f'Bearer {self.token}'}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+            self.assertEqual(body, await sync_to_async(self.export)(export_format))
+
+class ListingSerializationTests(TestCase):
+    """The lean listing path renders the same bytes as TimeEntrySerializer and JSONRenderer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='lean', email='lean@example.com', password='pw')
+        project = Project.objects.create(name='Caf\u00e9 \u2028 \U0001F600', user=user)
+        now = timezone.now()
+        TimeEntry.objects.create(
+            user=user, project=project, description='line\nbreak "quoted" \u2029',
+            start_time=now - timedelta(hours=2, seconds=7), end_time=now - timedelta(hours=1)
+        )
+        TimeEntry.objects.create(user=user, start_time=now - timedelta(days=40), end_time=now - timedelta(days=39))
+        TimeEntry.objects.create(user=user, project=project, start_time=now, status='running')
+        cls.entries = TimeEntry.objects.filter(user=user).order_by('-start_time')
+
+    def test_same_output(self):
+        expected = JSONRenderer().render(TimeEntrySerializer(self.entries.for_listing(), many=True).data)
+        self.assertEqual(FastJSONRenderer().render(time_entry_rows_data(self.entries.listing_values())), expected)
+
+    def test_other_timezone(self):
+        with timezone.override('America/New_York'):
+            self.test_same_output()
+
+
+class AdminTests(TestCase):
+    """The changelists of the large tables never list or count whole related tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pw')
+        cls.user = User.objects.create_user(username='listed', email='listed@example.com', password='pw')
+        cls.project = Project.objects.create(name='Listed', user=cls.user)
+        now = timezone.now()
+        cls.entries = TimeEntry.objects.bulk_create([
+            TimeEntry(
+                user=owner, project=cls.project if owner == cls.user else None, status='stopped',
+                start_time=now - timedelta(hours=i + 1), end_time=now - timedelta(hours=i)
+            )
+            for owner in (cls.admin, cls.user) for i in range(3)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, params):
+        response = self.client.get('/admin/api/timeentry/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_autocomplete_filter(self):
+        response = self.changelist({'user__id__exact': self.user.id})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertContains(response, 'admin-autocomplete-filter')
+        # The selected user is the only one rendered in the filter
+        self.assertContains(response, f'<option value="{self.user.id}" selected>listed@example.com</option>', html=True)
+        self.assertNotContains(response, '<option value="%s"' % self.admin.id)
+
+    def test_search(self):
+        response = self.changelist({'q': 'LISTED@'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.changelist({'q': str(self.entries[0].id)})
+        self.assertEqual([entry.id for entry in response.context['cl'].result_list], [self.entries[0].id])
+
+    def test_exact_count_below_threshold(self):
+        paginator = EstimatedCountPaginator(TimeEntry.objects.order_by('-start_time', '-id'), 2)
+        self.assertEqual((paginator.count, paginator.num_pages), (6, 3))
+
+
+@override_settings(API_METRICS_TOKEN='scrape-token')
+class MetricsTests(TestCase):
+    """/metrics is only served to staff and to the scraper's token, Server-Timing only when enabled"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pw', is_staff=True)
+        cls.user = User.objects.create_user(username='metered', email='metered@example.com', password='pw')
+
+    def test_refused_without_credentials(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="metrics"')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+
+    def test_token(self):
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '# TYPE http_request_duration_seconds histogram')
+
+    @override_settings(API_METRICS_TOKEN='')
+    def test_no_token_configured(self):
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code, 401)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_server_timing(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with override_settings(API_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', client.get('/api/timer/status/'))
+        with override_settings(API_SERVER_TIMING=True):
+            self.assertRegex(client.get('/api/timer/status/')['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+
+@override_settings(
+    API_PASSWORD_HASHING_POOL='thread', API_PASSWORD_HASHING_WORKERS=1, API_PASSWORD_HASHING_QUEUE=0,
+    API_THROTTLE_RATES={},
+)
+class PasswordHashingPoolTests(TestCase):
+    """A full hashing pool fails logins: with a 503 from the API, like a wrong password elsewhere"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='hashed', email='hashed@example.com', password='pw')
+
+    def setUp(self):
+        # Take the only slot until the test ends
+        release = threading.Event()
+        get_hashing_pool().submit(release.wait)
+        self.addCleanup(release.set)
+
+    def test_authenticate(self):
+        self.assertIsNone(authenticate(username='hashed@example.com', password='pw'))
+
+    def test_admin_login(self):
+        response = self.client.post('/admin/login/', {'username': 'hashed@example.com', 'password': 'pw'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+
+    def test_api_login(self):
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'hashed@example.com', 'password': 'pw'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    async def test_async_api_login(self):
+        response = await self.async_client.post(
+            '/api/async/auth/login/', {'email': 'hashed@example.com', 'password': 'pw'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 503)
+
+
+class SeedingTests(TestCase):
+    """Seeded rollups are the ones rebuilt from the seeded entries"""
+
+    def test_rollups(self):
+        # An offset end must not cut the UTC users' days in that offset
+        end = datetime(2026, 1, 1, 1, 30, tzinfo=dt_timezone(timedelta(hours=2)))
+        counts = seed(3, 200, end=end, password='pw')
+        self.assertEqual((counts['users'], counts['entries']), (3, 600))
+        self.assertFalse(TimeEntry.objects.filter(end_time__gt=end).exists())
+
+        def rollups():
+            return sorted(DailyRollup.objects.values_list('user_id', 'project_id', 'day', 'total_seconds', 'entry_count'), key=str)
+
+        seeded = rollups()
+        self.assertEqual(len(seeded), counts['rollups'])
+        DailyRollup.objects.rebuild()
+        self.assertEqual(seeded, rollups())
+
+
+class PartitioningTests(TestCase):
+    """Time entry partitioning on PostgreSQL, and the migrations it cannot take"""
+
+    def test_conflicting_operations(self):
+        migration = migrations.Migration('0099_example', 'api')
+        migration.operations = [
+            migrations.AlterField('timeentry', 'start_time', models.DateTimeField(db_index=True)),
+            migrations.AddField('timeentry', 'note', models.TextField(blank=True)),
+            migrations.AddConstraint('timeentry', models.UniqueConstraint(fields=['user', 'description'], name='unique_description')),
+            migrations.AddConstraint('timeentry', models.UniqueConstraint(fields=['user', 'start_time'], name='unique_start')),
+            migrations.AlterField('project', 'id', models.BigAutoField(primary_key=True)),
+            migrations.SeparateDatabaseAndState(state_operations=[migrations.RemoveField('timeentry', 'id')]),
+            migrations.RenameModel('TimeEntry', 'Entry'),
+        ]
+        self.assertEqual(
+            [operation.describe() for operation in partitioning.conflicting_operations(migration)],
+            [operation.describe() for operation in [migration.operations[i] for i in (0, 2, 6)]]
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partitioning requires PostgreSQL')
+    @override_settings(API_PARTITION_TIME_ENTRIES=True)
+    def test_convert(self):
+        user = User.objects.create_user(username='partitioned', email='partitioned@example.com', password='pw')
+        now = timezone.now()
+        old = TimeEntry.objects.create(user=user, start_time=now - timedelta(days=400), end_time=now - timedelta(days=400))
+        created = partitioning.convert(connection, ahead=2)
+        self.assertTrue(partitioning.is_partitioned(connection))
+        self.assertIn(partitioning.partition_name(partitioning.month_of(old.start_time)), created)
+        self.assertEqual(partitioning.create_partitions(connection, ahead=2), [])
+        with self.assertRaises(ValueError):
+            partitioning.convert(connection, ahead=2)
+
+        # Timers and the dashboard work on the partitioned table
+        time_entry = TimeEntry.objects.start_timer(user.id)
+        self.assertIsNone(TimeEntry.objects.start_timer(user.id))
+        self.assertEqual([entry['id'] for entry in summary_entries(user.id)], [time_entry.id, old.id])
+        self.assertEqual(TimeEntry.objects.stop_timer(user.id, time_entry.id).status, 'stopped')
+
+        # Migrations the partitioned table cannot take are refused
+        migration = migrations.Migration('0099_example', 'api')
+        migration.operations = [migrations.AlterField('timeentry', 'start_time', models.DateTimeField(db_index=True))]
+        with self.assertRaises(CommandError):
+            partitioning.check_migration_plan([(migration, False)], connection.alias)
+        migration.partition_safe = True
+        partitioning.check_migration_plan([(migration, False)], connection.alias)
+
+        detached = partitioning.detach_partitions(connection, partitioning.month_of(now), drop=True)
+        self.assertIn(partitioning.partition_name(partitioning.month_of(old.start_time)), detached)
+        self.assertFalse(TimeEntry.objects.filter(pk=old.pk).exists())
+
+    def test_not_partitioned(self):
+        self.assertFalse(partitioning.is_partitioned(connection))
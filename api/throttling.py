@@ -0,0 +1,171 @@
+"""
+Token bucket rate limiting, applied by the @throttle(scope) view decorator.
+
+The decorator goes above @api_view so that a throttled request is rejected
+before DRF authenticates it: nothing touches the database or hashes a
+password. Requests are counted per user when they carry a valid access
+token (checked from its signature alone) and per client IP otherwise.
+
+The rate of each scope is set in API_THROTTLE_RATES as "<requests>/<period>"
+(s, min, hour or day). A bucket holds up to <requests> tokens and refills
+at that rate, so a client may burst up to the full amount then continues at
+the steady rate. Buckets live in API_THROTTLE_STORE: in process memory for
+development and tests, or in Redis so all workers share them.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Return (capacity, tokens per second) of a "<requests>/<period>" rate"""
+    requests, period = rate.split('/')
+    return int(requests), int(requests) / PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """Buckets in process memory, for development and tests"""
+    max_buckets = 100_000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def consume(self, key, capacity, refill_rate):
+        """Take a token from the bucket; return 0, or the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+# Refill and take a token in one step, on the Redis server's clock
+CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill_rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill_rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Buckets in Redis (or a compatible server), shared by every worker"""
+    key_prefix = 'api:throttle:'
+
+    def __init__(self, url=None):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBucketStore requires the redis package.')
+        url = url or getattr(settings, 'API_THROTTLE_REDIS_URL', None)
+        if not url:
+            raise ImproperlyConfigured('RedisBucketStore requires API_THROTTLE_REDIS_URL.')
+        self._consume = redis.Redis.from_url(url).register_script(CONSUME_SCRIPT)
+
+    def consume(self, key, capacity, refill_rate):
+        return float(self._consume(keys=[self.key_prefix + key], args=[capacity, refill_rate]))
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store():
+    return import_string(settings.API_THROTTLE_STORE)()
+
+
+@receiver(setting_changed)
+def reset_bucket_store(setting, **kwargs):
+    if setting == 'API_THROTTLE_STORE':
+        get_bucket_store.cache_clear()
+
+
+def request_ident(request):
+    """'user:<id>' for a request with a valid access token, else 'ip:<address>'"""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token:
+        try:
+            token = authentication.get_validated_token(raw_token)
+        except (AuthenticationFailed, InvalidToken):
+            pass
+        else:
+            if jwt_settings.USER_ID_CLAIM in token:
+                return f'user:{token[jwt_settings.USER_ID_CLAIM]}'
+    # Honours REST_FRAMEWORK['NUM_PROXIES'] for X-Forwarded-For
+    return f'ip:{BaseThrottle().get_ident(request)}'
+
+
+def check_rate(scope, request):
+    """Consume a token of the scope's bucket; return 0, or the seconds to wait"""
+    rate = settings.API_THROTTLE_RATES.get(scope)
+    if not rate:
+        return 0
+    capacity, refill_rate = parse_rate(rate)
+    return get_bucket_store().consume(f'{scope}:{request_ident(request)}', capacity, refill_rate)
+
+
+def throttled(wait):
+    response = JsonResponse(
+        {'detail': f'Request was throttled. Expected available in {math.ceil(wait)} seconds.'},
+        status=429
+    )
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def throttle(scope):
+    """
+    Rate limit a view with the bucket of `scope`. Put it above @api_view (or
+    on an async view) so that it runs first.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapped_view(request, *args, **kwargs):
+                wait = await sync_to_async(check_rate, thread_sensitive=False)(scope, request)
+                if wait:
+                    return throttled(wait)
+                return await view(request, *args, **kwargs)
+            return async_wrapped_view
+
+        @wraps(view)
+        def wrapped_view(request, *args, **kwargs):
+            wait = check_rate(scope, request)
+            if wait:
+                return throttled(wait)
+            return view(request, *args, **kwargs)
+        return wrapped_view
+    return decorator
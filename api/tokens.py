@@ -0,0 +1,63 @@
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from .revocation import record_revocation, revocation_cache
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    Refresh token whose blacklist check goes through the revocation cache,
+    and which can be rotated exactly once.
+    """
+
+    def check_blacklist(self):
+        if revocation_cache.is_revoked(self.payload[jwt_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        record_revocation(self.payload[jwt_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+        return result
+
+    def rotate(self):
+        """
+        Blacklist this token and return a new refresh token with the same
+        claims. Raises TokenError if the token was already rotated, so that
+        concurrent or replayed refreshes with the same token fail.
+        """
+        jti = self.payload[jwt_settings.JTI_CLAIM]
+        expires_at = datetime_from_epoch(self.payload['exp'])
+        user_id = int(self.payload[jwt_settings.USER_ID_CLAIM])
+
+        rotated = type(self)()
+        for claim, value in self.payload.items():
+            if claim not in (jwt_settings.JTI_CLAIM, 'exp', 'iat'):
+                rotated[claim] = value
+
+        with transaction.atomic():
+            outstanding, _created = OutstandingToken.objects.get_or_create(jti=jti, defaults={
+                'user_id': user_id,
+                'token': str(self),
+                'created_at': self.current_time,
+                'expires_at': expires_at,
+            })
+            # The unique token column decides between concurrent rotations,
+            # without reading the blacklist first
+            try:
+                with transaction.atomic():
+                    BlacklistedToken.objects.create(token=outstanding)
+            except IntegrityError:
+                raise TokenError(_("Token is blacklisted"))
+            OutstandingToken.objects.create(
+                user_id=user_id,
+                jti=rotated[jwt_settings.JTI_CLAIM],
+                token=str(rotated),
+                created_at=rotated.current_time,
+                expires_at=datetime_from_epoch(rotated['exp']),
+            )
+            record_revocation(jti, expires_at)
+        return rotated
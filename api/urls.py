@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views, auth_views
+from . import views, auth_views, async_views
 
 urlpatterns = [
     # Test endpoint
@@ -10,6 +10,7 @@ urlpatterns = [
     path('auth/login/', auth_views.login, name='login'),
     path('auth/verify-email/', auth_views.verify_email, name='verify-email'),
     path('auth/refresh/', auth_views.refresh_token, name='refresh-token'),
+    path('auth/logout/', auth_views.logout, name='logout'),
     
     # Project endpoints
     path('projects/', views.projects, name='projects'),
@@ -17,8 +18,19 @@ urlpatterns = [
     
     # Time tracking endpoints
     path('time-entries/', views.time_entries, name='time-entries'),
+    path('time-entries/export/', views.export_time_entries, name='time-entries-export'),
+    path('time-entries/batch/', views.batch_time_entries, name='time-entries-batch'),
     path('timer/start/', views.start_timer, name='start-timer'),
     path('timer/stop/', views.stop_timer, name='stop-timer'),
     path('timer/status/', views.timer_status, name='timer-status'),
+    path('timer/events/', async_views.timer_events, name='timer-events'),
     path('dashboard/', views.dashboard_summary, name='dashboard-summary'),
+    path('reports/', views.reports, name='reports'),
+    
+    # Async versions of the timer and dashboard endpoints, for ASGI deployments
+    path('async/auth/login/', async_views.login, name='async-login'),
+    path('async/timer/start/', async_views.start_timer, name='async-start-timer'),
+    path('async/timer/stop/', async_views.stop_timer, name='async-stop-timer'),
+    path('async/timer/status/', async_views.timer_status, name='async-timer-status'),
+    path('async/dashboard/', async_views.dashboard_summary, name='async-dashboard-summary'),
 ]
\ No newline at end of file
@@ -1,16 +1,28 @@
 from django.shortcuts import render, get_object_or_404
-from rest_framework.decorators import api_view, permission_classes
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.utils import timezone
-from datetime import datetime, timedelta
-from django.db.models import Sum, Q
 from .serializers import (
     ProjectSerializer, TimeEntrySerializer, StartTimerSerializer, 
-    StopTimerSerializer, TimeEntrySummarySerializer
+    StopTimerSerializer, TimeEntryFilterSerializer, ReportFilterSerializer,
+    time_entry_rows_data
 )
 from .models import Project, TimeEntry
+from .pagination import TimeEntryCursorPagination
+from .renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from .exports import astream_export, stream_export
+from .imports import import_time_entries
+from .cache import conditional_on_user_version, get_user_timezone
+from .events import publish_event
+from .dashboard import split_entries, summary_data, summary_entries, summary_totals
+from .reports import build_report
+from .throttling import throttle
+
+# Largest list accepted by batch_time_entries, larger imports go through import_entries
+MAX_BATCH_ROWS = 5000
 
 @api_view(['GET'])
 def test_api(request):
@@ -28,12 +40,13 @@ def test_api(request):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_on_user_version
 def projects(request):
     """
     List all projects for the authenticated user or create a new project.
     """
     if request.method == 'GET':
-        projects = Project.objects.filter(user=request.user, is_active=True)
+        projects = Project.objects.filter(user_id=request.user.id, is_active=True)
         serializer = ProjectSerializer(projects, many=True)
         return Response(serializer.data)
     
@@ -41,16 +54,18 @@ def projects(request):
         serializer = ProjectSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
+            publish_event(request.user.id, 'project.created', serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional_on_user_version
 def project_detail(request, pk):
     """
     Retrieve, update or delete a project.
     """
-    project = get_object_or_404(Project, pk=pk, user=request.user)
+    project = get_object_or_404(Project, pk=pk, user_id=request.user.id)
     
     if request.method == 'GET':
         serializer = ProjectSerializer(project)
@@ -60,24 +75,81 @@ def project_detail(request, pk):
         serializer = ProjectSerializer(project, data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
+            publish_event(request.user.id, 'project.updated', serializer.data)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
         project.is_active = False
         project.save()
+        publish_event(request.user.id, 'project.deleted', {'id': project.id})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer])
 def time_entries(request):
     """
-    List all time entries for the authenticated user.
+    List the authenticated user's time entries, newest first, one page at a
+    time. Supports `from`/`to`/`project`/`status` filters, `page_size`, and
+    the `cursor` returned as `next` by the previous page. Without `cursor`
+    or `page_size` the first 50 entries are returned as a plain list.
+    """
+    filters = TimeEntryFilterSerializer(data=request.query_params)
+    if not filters.is_valid():
+        return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    entries = filters.filter_queryset(TimeEntry.objects.filter(user_id=request.user.id).listing_values())
+    paginator = TimeEntryCursorPagination()
+    page = paginator.paginate_queryset(entries, request)
+    return paginator.get_paginated_response(time_entry_rows_data(page))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([CSVRenderer, NDJSONRenderer])
+def export_time_entries(request):
+    """
+    Stream all of the authenticated user's time entries, oldest first, as
+    CSV (default, or ?format=csv) or newline delimited JSON (?format=ndjson).
+    Accepts the same from/to/project/status filters as the list endpoint.
+    """
+    filters = TimeEntryFilterSerializer(data=request.query_params)
+    if not filters.is_valid():
+        return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    entries = filters.filter_queryset(TimeEntry.objects.filter(user_id=request.user.id))
+    export_format = request.accepted_renderer.format
+    if isinstance(request._request, ASGIRequest):
+        chunks = astream_export(entries, export_format)
+    else:
+        chunks = stream_export(entries, export_format)
+    response = StreamingHttpResponse(
+        chunks,
+        content_type=f'{request.accepted_renderer.media_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="time-entries.{export_format}"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_time_entries(request):
+    """
+    Create or update many stopped time entries at once. Expects a list of
+    entries (with `id` to update an existing one) and reports errors per row.
     """
-    entries = TimeEntry.objects.filter(user=request.user).order_by('-start_time')[:50]
-    serializer = TimeEntrySerializer(entries, many=True)
-    return Response(serializer.data)
+    rows = request.data
+    if not isinstance(rows, list):
+        return Response({'non_field_errors': ["Expected a list of time entries."]}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > MAX_BATCH_ROWS:
+        return Response(
+            {'non_field_errors': [f"At most {MAX_BATCH_ROWS} time entries can be sent at once."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    report = import_time_entries(request.user.id, rows)
+    return Response(report, status=status.HTTP_200_OK)
 
+@throttle('timer')
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def start_timer(request):
@@ -86,25 +158,27 @@ def start_timer(request):
     """
     serializer = StartTimerSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        project_id = serializer.validated_data.get('project_id')
-        project = None
-        
-        if project_id:
-            project = Project.objects.get(id=project_id)
-        
-        time_entry = TimeEntry.objects.create(
-            project=project,
-            user=request.user,
-            description=serializer.validated_data.get('description', ''),
-            start_time=timezone.now(),
-            status='running'
-        )
+        try:
+            time_entry = TimeEntry.objects.start_timer(
+                user_id=request.user.id,
+                project_id=serializer.validated_data.get('project_id'),
+                description=serializer.validated_data.get('description', '')
+            )
+        except Project.DoesNotExist:
+            return Response({'project_id': ["Project not found"]}, status=status.HTTP_400_BAD_REQUEST)
+        if time_entry is None:
+            return Response(
+                {'non_field_errors': ["You already have a running timer. Please stop it first."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         response_serializer = TimeEntrySerializer(time_entry)
+        publish_event(request.user.id, 'timer.started', response_serializer.data)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@throttle('timer')
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def stop_timer(request):
@@ -113,27 +187,35 @@ def stop_timer(request):
     """
     serializer = StopTimerSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        time_entry = TimeEntry.objects.get(id=serializer.validated_data['time_entry_id'])
-        time_entry.end_time = timezone.now()
-        time_entry.status = 'stopped'
-        time_entry.save()
+        time_entry = TimeEntry.objects.stop_timer(
+            user_id=request.user.id,
+            time_entry_id=serializer.validated_data['time_entry_id']
+        )
+        if time_entry is None:
+            return Response(
+                {'time_entry_id': ["Running time entry not found"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         response_serializer = TimeEntrySerializer(time_entry)
+        publish_event(request.user.id, 'timer.stopped', response_serializer.data)
         return Response(response_serializer.data, status=status.HTTP_200_OK)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@throttle('timer_status')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_on_user_version
 def timer_status(request):
     """
     Get the current running timer status for the user.
     """
     running_timer = TimeEntry.objects.filter(
-        user=request.user, 
+        user_id=request.user.id,
         status='running',
         end_time__isnull=True
-    ).first()
+    ).for_listing().first()
     
     if running_timer:
         serializer = TimeEntrySerializer(running_timer)
@@ -143,58 +225,36 @@ def timer_status(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer])
 def dashboard_summary(request):
     """
     Get time tracking summary for dashboard.
     """
-    now = timezone.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    month_start = today_start.replace(day=1)
-    
-    # Get running timer
-    running_timer = TimeEntry.objects.filter(
-        user=request.user, 
-        status='running',
-        end_time__isnull=True
-    ).first()
-    
-    # Get recent entries
-    recent_entries = TimeEntry.objects.filter(
-        user=request.user
-    ).order_by('-start_time')[:10]
-    
-    # Calculate totals
-    today_total = TimeEntry.objects.filter(
-        user=request.user,
-        start_time__gte=today_start,
-        status='stopped'
-    ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-    
-    week_total = TimeEntry.objects.filter(
-        user=request.user,
-        start_time__gte=week_start,
-        status='stopped'
-    ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-    
-    month_total = TimeEntry.objects.filter(
-        user=request.user,
-        start_time__gte=month_start,
-        status='stopped'
-    ).aggregate(total=Sum('duration_seconds'))['total'] or 0
+    # Days, weeks and months start at midnight in the user's own timezone
+    tzinfo = get_user_timezone(request.user.id)
+    running_timer, recent_entries = split_entries(time_entry_rows_data(summary_entries(request.user.id)))
+    totals = summary_totals(request.user.id, tzinfo)
     
-    def format_duration(seconds):
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        return f"{hours}h {minutes}m"
-    
-    summary_data = {
-        'total_time_today': format_duration(today_total),
-        'total_time_this_week': format_duration(week_total),
-        'total_time_this_month': format_duration(month_total),
-        'running_timer': TimeEntrySerializer(running_timer).data if running_timer else None,
-        'recent_entries': TimeEntrySerializer(recent_entries, many=True).data
-    }
+    return Response(summary_data(running_timer, recent_entries, totals))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_on_user_version
+def reports(request):
+    """
+    Time totals between ?from= and ?to= (dates, `to` exclusive), per project
+    and per ?group_by=day|week|month bucket. ?project= restricts it to one
+    project and ?breakdown=true adds the per-project totals of each bucket.
+    """
+    filters = ReportFilterSerializer(data=request.query_params)
+    if not filters.is_valid():
+        return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+    params = filters.validated_data
     
-    serializer = TimeEntrySummarySerializer(summary_data)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(build_report(
+        request.user.id, params['from'], params['to'],
+        group_by=params['group_by'],
+        project_id=params.get('project'),
+        breakdown=params['breakdown']
+    ))
@@ -2,6 +2,7 @@ import os
 import dj_database_url
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +33,7 @@ INSTALLED_APPS = [
     # Other apps
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
 
     # Local apps
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -70,8 +73,173 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
+# Connections are reused across requests for DB_CONN_MAX_AGE seconds (0 opens one
+# per request, 'None' keeps them forever) and checked before reuse when
+# DB_CONN_HEALTH_CHECKS is set. config/asgi.py defaults it to 0: under ASGI each
+# request's connection is opened in a thread of its own and never reused, so
+# persistent ones pile up. With DB_POOL_MAX_SIZE > 0, connections come from
+# psycopg 3's pool instead (PostgreSQL with psycopg[pool] installed), which
+# Django only allows with DB_CONN_MAX_AGE=0.
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '60')
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '0'))
 DATABASES = {
-    'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'))
+    'default': dj_database_url.config(
+        default=os.environ.get('DATABASE_URL'),
+        conn_max_age=0 if DB_POOL_MAX_SIZE else (None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)),
+        conn_health_checks=os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    )
+}
+if DB_POOL_MAX_SIZE:
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        # psycopg2 would reject the pool option with an obscure DSN error
+        raise ImproperlyConfigured('DB_POOL_MAX_SIZE needs psycopg 3 and its pool: pip install "psycopg[pool]"')
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': DB_POOL_MAX_SIZE,
+        # Seconds a request waits for a free connection before failing
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    }
+
+# PostgreSQL only: the time entries table is partitioned by month of start_time.
+# Set it, then run `manage.py partition_time_entries --convert` (see api.partitioning).
+API_PARTITION_TIME_ENTRIES = os.environ.get('PARTITION_TIME_ENTRIES', 'False') == 'True'
+
+# Cache used for ETag version stamps. Local memory by default (and in tests),
+# set REDIS_URL in production so all workers share the same stamps.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+API_CACHE_ALIAS = 'default'
+# Front the refresh token blacklist with the cache (see api.revocation). Only
+# correct when every worker shares the cache, so it is on with REDIS_URL;
+# otherwise each refresh checks the blacklist table.
+API_REVOCATION_CACHE = os.environ.get('REVOCATION_CACHE', str(bool(os.environ.get('REDIS_URL')))) == 'True'
+
+# 'database' loads request.user from the database on every API request,
+# 'token' builds it from the access token without a query (see api.authentication).
+API_AUTH_USER_MODE = os.environ.get('AUTH_USER_MODE', 'database')
+# Seconds a user's active flag is cached in token mode, 0 disables the check
+API_AUTH_ACTIVE_CACHE_TTL = int(os.environ.get('AUTH_ACTIVE_CACHE_TTL', '30'))
+
+# Pub/sub behind the /api/timer/events/ stream. The in-memory broker only
+# reaches streams in the same process, use Redis with several workers.
+if os.environ.get('REDIS_URL'):
+    EVENTS_BROKER = 'api.events.RedisBroker'
+    EVENTS_REDIS_URL = os.environ['REDIS_URL']
+else:
+    EVENTS_BROKER = 'api.events.InMemoryBroker'
+
+# Password hashing. PASSWORD_HASHER=argon2 hashes new passwords with Argon2id;
+# hashes made with another hasher or other costs are upgraded on the next login.
+PASSWORD_HASHERS = [
+    'api.hashers.PBKDF2PasswordHasher',
+    'api.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if os.environ.get('PASSWORD_HASHER') == 'argon2':
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+API_PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', '1000000'))
+# Argon2id costs, memory in KiB (the defaults are OWASP's 19 MiB, 2 passes, 1 lane)
+API_ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', '2'))
+API_ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', '19456'))
+API_ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', '1'))
+
+# Verify passwords on a bounded 'thread' or 'process' pool instead of the
+# request thread. When WORKERS + QUEUE logins are in flight, further logins
+# get a 503 instead of piling up. WORKERS defaults to the number of CPUs.
+API_PASSWORD_HASHING_POOL = os.environ.get('PASSWORD_HASHING_POOL', '')
+API_PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', '0'))
+API_PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', '64'))
+
+AUTHENTICATION_BACKENDS = ['api.backends.ModelBackend']
+
+# Token bucket rate limits per scope (see api.throttling), "<requests>/<period>".
+# THROTTLE_RATES overrides them, e.g. "login=20/min,timer_status=300/min"; an
+# empty rate disables a scope.
+API_THROTTLE_RATES = {
+    'register': '10/hour',
+    'login': '10/min',
+    'refresh': '30/min',
+    'timer': '60/min',
+    'timer_status': '120/min',
+}
+API_THROTTLE_RATES.update(
+    item.split('=', 1) for item in os.environ.get('THROTTLE_RATES', '').split(',') if item
+)
+if os.environ.get('REDIS_URL'):
+    API_THROTTLE_STORE = 'api.throttling.RedisBucketStore'
+    API_THROTTLE_REDIS_URL = os.environ['REDIS_URL']
+else:
+    API_THROTTLE_STORE = 'api.throttling.LocalBucketStore'
+
+# Per-request timings (api.metrics): a Server-Timing header on every response and
+# one JSON line per request on the api.performance logger, at WARNING for requests
+# slower than API_SLOW_REQUEST_MS and at DEBUG for the others. The header tells
+# clients how much database work a request did, so it is only on by default with DEBUG.
+API_SERVER_TIMING = os.environ.get('SERVER_TIMING', str(DEBUG)) == 'True'
+API_SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', '500'))
+# /metrics is served to staff users and to scrapers sending `Authorization: Bearer <METRICS_TOKEN>`
+API_METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Repeated (N+1) and slow query detection per request (api.querycheck):
+# '' off, 'warn' logs them, 'raise' fails the request. On by default with DEBUG.
+API_QUERY_CHECK = os.environ.get('QUERY_CHECK', 'warn' if DEBUG else '')
+API_QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', '3'))
+API_SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '100'))
+
+# Background tasks (api.queue), run by `manage.py run_worker`. TASKS_EAGER=True runs
+# them in the web process after the transaction commits, for development without a worker.
+API_TASKS_EAGER = os.environ.get('TASKS_EAGER', 'False') == 'True'
+# Seconds after which a running task is considered lost with its worker and retried
+API_TASK_TIMEOUT = int(os.environ.get('TASK_TIMEOUT', '300'))
+# Retries wait API_TASK_RETRY_DELAY seconds, doubled after each failure up to the max
+API_TASK_RETRY_DELAY = int(os.environ.get('TASK_RETRY_DELAY', '10'))
+API_TASK_RETRY_MAX_DELAY = int(os.environ.get('TASK_RETRY_MAX_DELAY', '3600'))
+# Days finished (done or failed) tasks are kept for inspection
+API_TASK_KEEP_DAYS = int(os.environ.get('TASK_KEEP_DAYS', '7'))
+
+# Admin changelists of more rows than this (by the PostgreSQL planner's estimate) show
+# the estimate instead of running an exact COUNT(*) (api.pagination.EstimatedCountPaginator)
+API_ADMIN_COUNT_ESTIMATE_THRESHOLD = int(os.environ.get('ADMIN_COUNT_ESTIMATE_THRESHOLD', '100000'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'api.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'api.tasks': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 # Password validation
@@ -121,7 +289,7 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework_simplejwt.authentication.JWTAuthentication',]
+    'DEFAULT_AUTHENTICATION_CLASSES': ['api.authentication.JWTAuthentication',]
 }
 
 # Email Configuration - Development Mode
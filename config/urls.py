@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
 import os
+from api.metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics, name='metrics'),
 ]